@@ -46,10 +46,9 @@
 # In[34]:
 
 
-from datetime import datetime
-time = datetime.now().strftime("%H:%M, %a %d %b")
-print(f"Loading bbSearch Version 2.1 (at {time})")
-print("Last module source code edit 9am Thursday 24th Feb 2022")
+## Importing the module prints nothing (so that worker processes and
+## command line tools can use it quietly); the version is kept here.
+BBSEARCH_VERSION = "2.1"
 
 
 # In[35]:
@@ -96,6 +95,16 @@ class SearchProblem:
         True for all and only those states that are considert "goal" states.
         """
         return False
+
+    def state_key(self, state):
+        """
+        This should return a hashable value that uniquely identifies a state.
+        It is used by `loop_check` to detect states that have already been
+        seen, so states that should count as the same must give equal keys.
+        The default uses the state's string representation, but a problem
+        can give a much smaller and faster key (e.g. a tuple of integers).
+        """
+        return state.__repr__()
     
     def cost(self, path, state):
         """
@@ -116,6 +125,40 @@ class SearchProblem:
         """
         raise NotImplementedError
 
+    def goal_states(self):
+        """
+        This is an optional method, only needed for the bidirectional 'BD/BFS'
+        mode. It should return (or yield) every goal state, which are the
+        starting points of the backward search.
+        """
+        raise NotImplementedError
+
+    def predecessors(self, state):
+        """
+        This is an optional method, only needed for the bidirectional 'BD/BFS'
+        mode. It should return a list of (action, previous_state) pairs, one
+        for each way that `state` can be reached by a single action. The states
+        of the backward search need not be the same kind of value as forward
+        states; they are compared using `meet_key` and `meets`.
+        """
+        raise NotImplementedError
+
+    def meet_key(self, state):
+        """
+        Used by the 'BD/BFS' mode to find forward and backward states that may
+        be the same. It should return a hashable key that is equal for such
+        states. The default is `state_key`.
+        """
+        return self.state_key(state)
+
+    def meets(self, forward_state, backward_state):
+        """
+        Used by the 'BD/BFS' mode when a forward and a backward state have the
+        same `meet_key`. It should return True if the backward state's path to
+        the goal can be followed from the forward state. The default is True.
+        """
+        return True
+
     def display_action(self, action):
         """
         You can set the way an action will be displayed in outputs.
@@ -284,7 +327,209 @@ class WeightedQueue:
     def display(self):
         for w, i in zip(self.weights, self.items):
             print(f"{w}: {i}")
-    
+
+    def __len__(self):
+        return len(self.items)
+
+
+# In[38]:
+
+
+import heapq, itertools
+
+## This is a priority queue implemented as a binary heap. Each entry is
+## a (weight, tiebreak, item) triple, where tiebreak comes from a monotonic
+## counter. Counting up gives FIFO order among equal weights and counting
+## down gives LIFO order, so the pop order is the same as for the bisect
+## based WeightedQueue, but insert and pop are O(log n) rather than O(n).
+
+class HeapQueue:
+
+    def __init__(self, mode='fifo', weightfunc=None ):
+        self.weightfunc = weightfunc
+        self.mode = mode
+        self.heap = []
+
+        if mode == 'fifo':
+            self.counter = itertools.count()
+        elif mode == 'lifo':
+            self.counter = itertools.count(0, -1)
+        else:
+            raise ValueError("!!! HeapQueue 'mode' keyword arg "
+                                  "must be 'fifo' or 'lifo'")
+
+    def insert(self, item, weight = None):
+        if weight == None:
+            weight = self.weightfunc(item)
+        heapq.heappush(self.heap, (weight, next(self.counter), item))
+
+    def initialise(self, items, weights=None):
+        if not weights:
+            weights = [self.weightfunc(i) for i in items]
+        self.heap = [(w, next(self.counter), i) for i, w in zip(items, weights)]
+        heapq.heapify(self.heap)
+
+    def pop(self):
+        return heapq.heappop(self.heap)[2]
+
+    def display(self):
+        for w, _, i in sorted(self.heap, key=lambda e: e[:2]):
+            print(f"{w}: {i}")
+
+    def __len__(self):
+        return len(self.heap)
+
+
+# In[39]:
+
+
+from collections import deque
+
+## This is an unweighted queue backed by a deque. In 'fifo' mode items
+## are appended on the right and popped from the left; in 'lifo' mode
+## they are appended and popped on the right. Both are O(1) and give the
+## same node order as the unweighted WeightedQueue.
+
+class DequeQueue:
+
+    def __init__(self, mode='fifo'):
+        self.mode = mode
+        self.items = deque()
+
+        if mode == 'fifo':
+            self.pop = self.items.popleft
+        elif mode == 'lifo':
+            self.pop = self.items.pop
+        else:
+            raise ValueError("!!! DequeQueue 'mode' keyword arg "
+                                  "must be 'fifo' or 'lifo'")
+
+    def insert(self, item, weight=None):
+        self.items.append(item)
+
+    def initialise(self, items, weights=None):
+        self.items.clear()
+        # The first item given should be the first one popped.
+        if self.mode == 'fifo':
+            self.items.extend(items)
+        else:
+            self.items.extend(reversed(items))
+
+    def display(self):
+        for i in self.items:
+            print(i)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# In[40]:
+
+
+from collections.abc import Sequence
+
+## A SearchNode records the state it holds, a reference to its parent
+## node and the action that led to it, rather than a copy of the whole
+## action path. The path is only rebuilt, by following parent links,
+## when it is needed (e.g. when a goal is found).
+
+class SearchNode:
+    __slots__ = ('state', 'parent', 'action', 'g', 'depth')
+
+    def __init__(self, state, parent=None, action=None, g=None):
+        self.state  = state
+        self.parent = parent
+        self.action = action
+        self.depth  = 0 if parent is None else parent.depth + 1
+        # g is the cost of reaching the node (path length if no cost given)
+        self.g      = self.depth if g is None else g
+
+    def path(self):
+        actions = []
+        node = self
+        while node.parent is not None:
+            actions.append(node.action)
+            node = node.parent
+        actions.reverse()
+        return actions
+
+
+## A NodePath is a lazy, read-only view of the action path leading to
+## a node. It is what `cost(path, state)` functions receive, so that
+## existing cost functions still work. len() is O(1); the action list
+## is only built if the path is indexed or iterated over.
+
+class NodePath(Sequence):
+    __slots__ = ('node', '_actions')
+
+    def __init__(self, node):
+        self.node = node
+        self._actions = None
+
+    def actions(self):
+        if self._actions is None:
+            self._actions = self.node.path()
+        return self._actions
+
+    def __len__(self):
+        return self.node.depth
+
+    def __getitem__(self, i):
+        return self.actions()[i]
+
+    def __add__(self, other):
+        return self.actions() + list(other)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(self.actions())
+
+
+# In[51]:
+
+
+from collections import OrderedDict
+
+## A heuristic wrapped with a bounded cache of its values. Values are
+## looked up by the state's key (e.g. problem.state_key), so a state that
+## comes up again (without loop_check, in iterative deepening, or as a
+## duplicate that loop_check is about to discard) is not evaluated again.
+## When the cache holds maxsize values, the least recently used is dropped.
+
+class CachedHeuristic:
+
+    def __init__( self, heuristic, key, maxsize=100000 ):
+        self.heuristic = heuristic
+        self.key = key
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.__name__ = getattr(heuristic, "__name__", "heuristic")
+
+    def __call__( self, state ):
+        key = self.key(state)
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self.misses += 1
+        value = self.heuristic(state)
+        cache[key] = value
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return value
+
+    def stats( self ):
+        calls = self.hits + self.misses
+        return { "hits"     : self.hits,
+                 "misses"   : self.misses,
+                 "hit_rate" : self.hits / calls if calls else 0,
+                 "size"     : len(self.cache),
+               }
 
 
 # In[44]:
@@ -292,7 +537,7 @@ class WeightedQueue:
 
 class SearchQueue:
     
-    def __init__( self, mode='BF/FIFO', cost=None, heuristic=None ):
+    def __init__( self, mode='BF/FIFO', cost=None, heuristic=None, queue_type='heap' ):
         self.mod = mode
         self.cost = cost
         self.heuristic = heuristic
@@ -310,13 +555,25 @@ class SearchQueue:
             raise ValueError("!!! SearchQueue 'mode' argument "
                                   "must be 'BF/FIFO' or 'DF/LIFO'")
         
-        self.wq = WeightedQueue(modemap[mode], weighted=self.weighted)
+        # queue_type selects the queue implementation: 'heap' (the default)
+        # uses a binary heap for weighted modes and a deque for unweighted
+        # ones; 'bisect' uses the original list based WeightedQueue.
+        if queue_type == 'heap':
+            if self.weighted:
+                self.wq = HeapQueue(modemap[mode])
+            else:
+                self.wq = DequeQueue(modemap[mode])
+        elif queue_type == 'bisect':
+            self.wq = WeightedQueue(modemap[mode], weighted=self.weighted)
+        else:
+            raise ValueError("!!! SearchQueue 'queue_type' argument "
+                                  "must be 'heap' or 'bisect'")
                 
     def empty(self):
-        return self.wq.items == []
+        return not self.wq
     
     def len(self):
-        return len(self.wq.items)
+        return len(self.wq)
     
     def insert(self,item, weight=None):
 #         print("Insert in SearchQueue")
@@ -341,6 +598,75 @@ class SearchQueue:
 
 import time, random
 
+## Amortised time limit and progress checks. Reading the clock on every
+## expansion is a noticeable part of the cost of the search loop, so a
+## search loop only calls check() when its node count reaches next_check.
+## The number of nodes between checks adapts so that checks come about
+## every CHECK_PERIOD seconds, which keeps max_time to within about that
+## much. check() also passes a dict of progress information to each of the
+## progress callbacks, at most every PROGRESS_PERIOD seconds.
+
+class SearchMonitor:
+
+    CHECK_PERIOD    = 0.005
+    PROGRESS_PERIOD = 0.1
+    MAX_INTERVAL    = 10000
+
+    def __init__( self, start_time, max_time, callbacks=() ):
+        self.start_time = start_time
+        self.max_time = max_time
+        self.callbacks = list(callbacks)
+        self.next_check = 0
+        self.interval = 1
+        self.last_check = start_time
+        self.last_progress = start_time
+
+    ## Returns the termination condition if the search should stop:
+    ## "TIME_LIMIT_EXCEEDED", or "SEARCH_CANCELLED" if a progress callback
+    ## returned True. Otherwise returns None.
+    def check( self, count, nodes_generated, nodes_tested, frontier_size, closed_set_size ):
+        now = time.perf_counter()
+        elapsed = now - self.start_time
+        if elapsed > self.max_time:
+            return "TIME_LIMIT_EXCEEDED"
+        if now > self.last_check:
+            target = int(self.interval * self.CHECK_PERIOD / (now - self.last_check))
+            self.interval = max(1, min(target, 2 * self.interval, self.MAX_INTERVAL))
+        self.last_check = now
+        self.next_check = count + self.interval
+        if self.callbacks and now - self.last_progress >= self.PROGRESS_PERIOD:
+            self.last_progress = now
+            info = { "nodes_generated" : nodes_generated,
+                     "nodes_tested"    : nodes_tested,
+                     "nodes_per_sec"   : nodes_tested / elapsed if elapsed else 0,
+                     "frontier_size"   : frontier_size,
+                     "closed_set_size" : closed_set_size,
+                     "time_taken"      : elapsed,
+                   }
+            cancelled = False
+            for callback in self.callbacks:
+                if callback(info):
+                    cancelled = True
+            if cancelled:
+                return "SEARCH_CANCELLED"
+        return None
+
+
+## Progress callback printing a dot for every 1000 goal tests and the
+## count every 100000 (the `dots` option of search).
+
+def dots_progress():
+    printed = 0
+    def show_dots(info):
+        nonlocal printed
+        while printed + 1000 <= info["nodes_tested"]:
+            printed += 1000
+            print('.', end='', flush=True)
+            if printed % 100000 == 0:
+                print( f' ({printed})', flush=True)
+    return show_dots
+
+
 def search( problem, 
             mode, 
             max_nodes,
@@ -353,59 +679,120 @@ def search( problem,
             dots             = True,
             return_info      = False,
             max_time         = 300,
+            queue_type       = 'heap',
+            tt_size          = 0,
+            depth_limit      = None,
+            verbose          = 1,
+            progress         = None,
+            heuristic_cache  = 0,
             #One could potentially define other node limits
             #max_generated    = False,
             #max_discarded    = False 
           ):
     
-    problem.info()
-    
-    print( "\n** Running Brandon's Search Algorithm **")
     cost_name = (cost.__name__ if cost else None)
     heuristic_name = (heuristic.__name__ if heuristic else None)
-    print( f"Strategy: mode={mode}, cost={cost_name}, heuristic={heuristic_name}")
-    print( f"Max search nodes: {max_nodes}  (max number added to queue)" ) 
-    print( f"Max time limit: {max_time} seconds" )
+
+    # A heuristic with a true `batch` attribute takes a list of states and
+    # returns a list of values. The main search loop gives it all the new
+    # children of a node at once; the other modes call it one state at a
+    # time.
+    batch_heuristic = None
+    if getattr(heuristic, "batch", False):
+        batch_heuristic = heuristic
+        heuristic = single_state_heuristic(batch_heuristic)
+
+    # heuristic_cache > 0 caches up to that many heuristic values
+    if heuristic and heuristic_cache and not batch_heuristic:
+        heuristic = CachedHeuristic(heuristic, problem.state_key, heuristic_cache)
+
+    # verbose=0 turns off all printing (including progress dots), so that
+    # batch runs do no output formatting at all.
+    if verbose:
+        problem.info()
+        print( "\n** Running Brandon's Search Algorithm **")
+        print( f"Strategy: mode={mode}, cost={cost_name}, heuristic={heuristic_name}")
+        print( f"Max search nodes: {max_nodes}  (max number added to queue)" ) 
+        print( f"Max time limit: {max_time} seconds" )
+    else:
+        dots = False
+
+    args = {"problem" : problem.__class__.__name__,
+                "mode" : mode,
+           "max_nodes" : max_nodes,
+          "loop_check" : loop_check,
+           "randomise" : randomise,
+                "cost" : cost_name,
+           "heuristic" : heuristic_name,
+               "dots"  : dots,
+         "depth_limit" : depth_limit,
+     "heuristic_cache" : heuristic_cache,
+            }
     
+    # progress is called with a dict of progress information (see
+    # SearchMonitor) about every SearchMonitor.PROGRESS_PERIOD seconds.
+    # If it returns True the search stops with "SEARCH_CANCELLED".
+    callbacks = []
+    show_dots = None
+    if dots:
+        print("Searching (will output '.' each 1000 goal_tests)", flush=True)
+        show_dots = dots_progress()
+        callbacks.append(show_dots)
+    elif verbose:
+        print( "Search started (progress dot output off)", flush=True)
+    if progress:
+        callbacks.append(progress)
+
     start_time = time.perf_counter()
-    queue = SearchQueue(mode,cost,heuristic)
-    queue.initialise( [([], problem.initial_state )], weights=[0] )
+    monitor = SearchMonitor(start_time, max_time, callbacks)
+
+    if mode in ITERATIVE_MODES:
+        termination_condition, node, search_stats = iterative_deepening_search(
+            problem, mode, max_nodes, loop_check, randomise,
+            cost, heuristic, tt_size, depth_limit, monitor )
+        return search_outcome( problem, termination_condition, node, search_stats, args,
+                               cost, max_nodes, max_time, show_path, show_state_path, return_info,
+                               verbose, heuristic, show_dots )
+
+    if mode == 'BD/BFS':
+        termination_condition, node, search_stats = bidirectional_search(
+            problem, max_nodes, randomise, cost, heuristic, monitor )
+        return search_outcome( problem, termination_condition, node, search_stats, args,
+                               cost, max_nodes, max_time, show_path, show_state_path, return_info,
+                               verbose, heuristic, show_dots )
+
+    queue = SearchQueue(mode,cost,heuristic,queue_type=queue_type)
+    queue.initialise( [SearchNode(problem.initial_state)], weights=[0] )
     global weight_function
     weight_function = node_weight_function( cost, heuristic )
     
-    states_seen = {problem.initial_state.__repr__()}
+    state_key = problem.state_key
+    states_seen = {state_key(problem.initial_state)}
     nodes_generated = 1  # counting initial state
     nodes_kept = 1
     nodes_tested = 0
     nodes_discarded = 0
     
     termination_condition = None
+    node = None   # stays None if the search stops before the first pop
     
     node_limit_exceeded = False
     
-    if not dots:
-        print( "Search started (progress dot output off)", flush=True)
-    
     while True:
-        # 检查是否超时
-        if time.perf_counter() - start_time > max_time:
-            termination_condition = "TIME_LIMIT_EXCEEDED"
-            break
+        # 检查是否超时（每隔若干次扩展检查一次）
+        if nodes_tested >= monitor.next_check:
+            stop = monitor.check( nodes_tested, nodes_generated, nodes_tested, queue.len(),
+                                 len(states_seen) if loop_check else None )
+            if stop:
+                termination_condition = stop
+                break
             
         if queue.empty():
             termination_condition = "SEARCH-SPACE_EXHAUSTED"  # Means there is no solution.
             break
         
-        if dots:
-            if nodes_tested % 1000 == 0:
-                if nodes_tested==0:
-                    print("Searching (will output '.' each 1000 goal_tests)", flush=True)
-                else:
-                    print('.', end='')
-                    if nodes_tested % 100000 == 0:
-                        print( f' ({nodes_tested})', flush=True)
-        
-        path, state = queue.pop()
+        node = queue.pop()
+        state = node.state
         nodes_tested += 1
         if problem.goal_test(state):
             termination_condition = "GOAL_STATE_FOUND"
@@ -422,26 +809,99 @@ def search( problem,
         if randomise: # randomise action choice sequance (may be useful in DFS)
             random.shuffle(actions)
         
+        children = []
         for i, a in enumerate(actions):
             suc = problem.successor(state,a)
             nodes_generated += 1
             if loop_check:
-                if suc.__repr__() in states_seen:
+                key = state_key(suc)
+                if key in states_seen:
                     nodes_discarded += 1
                     continue # skip already seen state
                 else:
-                    states_seen.add(suc.__repr__())
+                    states_seen.add(key)
             nodes_kept += 1
             if nodes_kept > max_nodes:
                 node_limit_exceeded = True
                 break
-            extended_path = path+[a]
-            #print("Making node with path:", extended_path)
-            weight=weight_function(extended_path,suc)
+            child = SearchNode(suc, node, a)
+            if cost:
+                child.g = cost(NodePath(child), suc)
+            if batch_heuristic:
+                children.append(child)
+                continue
+            weight=weight_function(child)
             #print("weight=", weight)
-            queue.insert((extended_path,suc), 
-                         weight=weight)
+            queue.insert(child, weight=weight)
+
+        if children:
+            values = batch_heuristic([child.state for child in children])
+            for child, h in zip(children, values):
+                queue.insert(child, weight=child.g + h if cost else h)
               
+    if loop_check:
+        distinct_states_seen = len(states_seen)
+    else:
+        distinct_states_seen = "not recorded (loop_check=False)"
+
+    search_stats = {
+         "nodes_generated"      : nodes_generated,
+         "nodes_tested"         : nodes_tested,
+         "nodes_discarded"      : nodes_discarded,
+         "distinct_states_seen" : distinct_states_seen,
+         "nodes_left_in_queue"  : queue.len(),
+         "time_taken"           : time.perf_counter() - start_time,
+         }
+    return search_outcome( problem, termination_condition, node, search_stats, args,
+                           cost, max_nodes, max_time, show_path, show_state_path, return_info,
+                           verbose, heuristic, show_dots )
+
+
+## Returns either the termination condition or, if return_info is set,
+## the full info dict, after printing the outcome and statistics of the
+## search if verbose is set. It is shared by all the search modes.
+
+def search_outcome( problem, termination_condition, node, search_stats, args,
+                    cost, max_nodes, max_time, show_path, show_state_path, return_info,
+                    verbose, heuristic=None, show_dots=None ):
+
+    # The dots callback only runs every SearchMonitor.PROGRESS_PERIOD, so
+    # print any dots still owed for the final number of goal tests.
+    if show_dots:
+        show_dots(search_stats)
+
+    if isinstance(heuristic, CachedHeuristic):
+        search_stats["heuristic_cache"] = heuristic.stats()
+
+    if termination_condition == "GOAL_STATE_FOUND":
+        goal_state = node.state
+        path = node.path()
+        path_length = len(path)
+    else:
+        goal_state=path=path_length=None
+
+    if verbose:
+        print_search_outcome( problem, termination_condition, goal_state, path, search_stats,
+                              args, cost, max_nodes, max_time, show_path, show_state_path )
+    
+    if not return_info:
+        return termination_condition
+    else:
+        return { 
+            "args" : args,
+            "result": {
+                     "termination_condition": termination_condition,
+                     "goal_state"           : goal_state,
+                     "path"                 : path,
+                     "path_length"          : path_length,
+                      },
+            "search_stats" : search_stats,
+           }
+
+
+def print_search_outcome( problem, termination_condition, state, path, search_stats,
+                          args, cost, max_nodes, max_time, show_path, show_state_path ):
+
     if termination_condition == "GOAL_STATE_FOUND":
         print( "\n:-)) *SUCCESS* ((-:\n" )
         print( f"Path length = {len(path)}" )
@@ -457,36 +917,37 @@ def search( problem,
         if show_state_path:
             print( "The state/action path to the solution is:" )
             problem.display_state_path(path)
-        goal_state = state
-        path_length = len(path)
         
     if termination_condition == "SEARCH-SPACE_EXHAUSTED":
         print("\n!! Search space exhausted (tried everying) !!")
         print("): No solution found :(\n")
-        goal_state=path=path_length=None
         
     if termination_condition == "NODE_LIMIT_EXCEEDED":
         print( f"\n!! Search node limit ({max_nodes}) reached !!")
         print("): No solution found :(\n")
-        goal_state=path=path_length=None
         
     if termination_condition == "TIME_LIMIT_EXCEEDED":
         print( f"\n!! Time limit ({max_time} seconds) exceeded !!")
         print("): No solution found :(\n")
-        goal_state=path=path_length=None
+
+    if termination_condition == "SEARCH_CANCELLED":
+        print("\n!! Search cancelled !!")
+        print("): No solution found :(\n")
+
+    if termination_condition == "DEPTH_LIMIT_REACHED":
+        print( f"\n!! Depth limit ({args['depth_limit']}) reached !!")
+        print("): No solution found :(\n")
+
+    nodes_generated = search_stats["nodes_generated"]
+    nodes_discarded = search_stats["nodes_discarded"]
+    nodes_tested = search_stats["nodes_tested"]
 
     print( f"\nSEARCH SPACE STATS:")     
     print( f"Total nodes generated          = {nodes_generated:>8}  (includes start)")
     
-    if loop_check:
-        distinct_states_seen = len(states_seen)
-    else:
-        distinct_states_seen = "not recorded (loop_check=False)"
-    
-    if loop_check:
+    if args["loop_check"]:
         print( f"Nodes discarded by loop_check  = {nodes_discarded:>8}" 
                 f"  ({nodes_generated-nodes_discarded} distinct states added to queue)" )
-        #print( f"Distinct states seen  = {distinct_states_seen:>8}" )
         
     print( f"Nodes tested (by goal_test)    = {nodes_tested:>8}",end=' ' )
     if termination_condition == "GOAL_STATE_FOUND":
@@ -494,54 +955,421 @@ def search( problem,
     else:
         print( " (all expanded)")
         
-    print( f"Nodes left in queue            = {queue.len():>8}")
-    time_taken = time.perf_counter() - start_time
-    print( f"\nTime taken = {round(time_taken, 4)} seconds\n" )
+    print( f"Nodes left in queue            = {search_stats['nodes_left_in_queue']:>8}")
+    if "iterations" in search_stats:
+        print( f"Iterations                     = {len(search_stats['iterations']):>8}")
+    if "heuristic_cache" in search_stats:
+        print( f"Heuristic cache hit rate       = {search_stats['heuristic_cache']['hit_rate']:>8.1%}")
+    print( f"\nTime taken = {round(search_stats['time_taken'], 4)} seconds\n" )
     
-    if not return_info:
-        return termination_condition
+
+# In[48]:
+
+
+## Depth-first modes with a bound. Rather than keeping a frontier, each
+## iteration is a depth-first search that cuts off every node whose f value
+## is over the current bound:
+##
+##   'DL/DFS'  depth-limited DFS: one iteration, f is the node depth and
+##             the bound is depth_limit.
+##   'ID/DFS'  iterative deepening DFS: f is the node depth, and the bound
+##             starts at 0 and goes up by one each iteration (up to
+##             depth_limit, if given).
+##   'IDA*'    f is g (the cost, or depth if there is no cost function)
+##             plus the heuristic, and each new bound is the smallest f
+##             value cut off in the previous iteration. This finds optimal
+##             paths when the heuristic is admissible.
+##
+## Memory use is proportional to the search depth. With loop_check, states
+## are only checked against the current path. The optional transposition
+## table holds at most tt_size entries, is cleared at each iteration, and
+## records the lowest f at which each state has been reached, so that
+## dearer routes to the same state are not searched again.
+##
+## max_nodes limits the total number of nodes generated over all the
+## iterations. search_stats["iterations"] lists the bound and node counts of
+## each iteration. If nodes were cut off at the depth limit and no goal was
+## found, the termination condition is "DEPTH_LIMIT_REACHED" rather than
+## "SEARCH-SPACE_EXHAUSTED".
+
+ITERATIVE_MODES = ('IDA*', 'ID/DFS', 'DL/DFS')
+
+def iterative_deepening_search( problem, mode, max_nodes, loop_check, randomise,
+                                cost, heuristic, tt_size, depth_limit, monitor ):
+    if mode == 'DL/DFS' and depth_limit is None:
+        raise ValueError("!!! search mode 'DL/DFS' needs a depth_limit")
+
+    state_key = problem.state_key
+    keyed = loop_check or tt_size > 0
+
+    if mode == 'IDA*':
+        def f(node):
+            return node.g + heuristic(node.state) if heuristic else node.g
     else:
-        return { 
-            "args" : {"problem" : problem.__class__.__name__,
-                          "mode" : mode,
-                     "max_nodes" : max_nodes,
-                    "loop_check" : loop_check,
-                     "randomise" : randomise,
-                          "cost" : cost_name,
-                     "heuristic" : heuristic_name,
-                         "dots"  : dots,
-                      },
-            "result": {
-                     "termination_condition": termination_condition,
-                     "goal_state"           : goal_state,
-                     "path"                 : path,
-                     "path_length"          : path_length,
-                      },
-            "search_stats" : {
-                 "nodes_generated"      : nodes_generated,
-                 "nodes_tested"         : nodes_tested,
-                 "nodes_discarded"      : nodes_discarded,
-                 "distinct_states_seen" : distinct_states_seen,
-                 "nodes_left_in_queue"  : queue.len(),
-                 "time_taken"           : time_taken,
-                 }
-           }
-    
+        def f(node):
+            return node.depth
+
+    def actions_of(state):
+        actions = problem.possible_actions(state)
+        if randomise:
+            random.shuffle(actions)
+        return iter(actions)
+
+    root = SearchNode(problem.initial_state)
+    if cost:
+        root.g = cost(NodePath(root), root.state)
+    if mode == 'DL/DFS':
+        bound = depth_limit
+    else:
+        bound = f(root)
+
+    nodes_generated = 1  # counting initial state
+    nodes_tested = 0
+    nodes_discarded = 0
+    iterations = []
+    table = {}
+    stack = []
+    no_action = object()
+    termination_condition = None
+
+    while termination_condition is None:
+        iteration = {"bound": bound, "nodes_generated": nodes_generated, "nodes_tested": nodes_tested}
+        table.clear()
+        next_bound = None
+        node = root
+
+        nodes_tested += 1
+        if problem.goal_test(root.state):
+            termination_condition = "GOAL_STATE_FOUND"
+        else:
+            key = state_key(root.state) if keyed else None
+            stack = [(root, actions_of(root.state), key)]
+            on_path = {key}
+
+        # Depth-first search below the bound, using an explicit stack of
+        # (node, remaining actions, state key) rather than recursion.
+        while stack and termination_condition is None:
+            if nodes_generated >= monitor.next_check:
+                stop = monitor.check( nodes_generated, nodes_generated, nodes_tested, len(stack),
+                                     len(table) if tt_size else None )
+                if stop:
+                    termination_condition = stop
+                    break
+
+            parent, actions, parent_key = stack[-1]
+            action = next(actions, no_action)
+            if action is no_action:
+                stack.pop()
+                on_path.discard(parent_key)
+                continue
+
+            suc = problem.successor(parent.state, action)
+            nodes_generated += 1
+            if nodes_generated > max_nodes:
+                termination_condition = "NODE_LIMIT_EXCEEDED"
+                break
+            child = SearchNode(suc, parent, action)
+            if cost:
+                child.g = cost(NodePath(child), suc)
+            child_f = f(child)
+            if child_f > bound:
+                if next_bound is None or child_f < next_bound:
+                    next_bound = child_f
+                continue
+
+            if keyed:
+                key = state_key(suc)
+                if loop_check and key in on_path:
+                    nodes_discarded += 1
+                    continue # state already on current path
+                if tt_size:
+                    seen_f = table.get(key)
+                    if seen_f is not None and seen_f <= child_f:
+                        nodes_discarded += 1
+                        continue # already reached at no greater cost
+                    if seen_f is not None or len(table) < tt_size:
+                        table[key] = child_f
+
+            nodes_tested += 1
+            if problem.goal_test(suc):
+                node = child
+                termination_condition = "GOAL_STATE_FOUND"
+                break
+            stack.append((child, actions_of(suc), key))
+            if loop_check:
+                on_path.add(key)
+
+        iteration["nodes_generated"] = nodes_generated - iteration["nodes_generated"]
+        iteration["nodes_tested"] = nodes_tested - iteration["nodes_tested"]
+        iterations.append(iteration)
+
+        if termination_condition is None:
+            if next_bound is None:
+                termination_condition = "SEARCH-SPACE_EXHAUSTED"
+            elif mode == 'DL/DFS' or (depth_limit is not None and next_bound > depth_limit):
+                termination_condition = "DEPTH_LIMIT_REACHED"
+            else:
+                bound = next_bound
+
+    if tt_size:
+        distinct_states_seen = len(table)
+    else:
+        distinct_states_seen = "not recorded (no transposition table)"
+
+    search_stats = {
+         "nodes_generated"      : nodes_generated,
+         "nodes_tested"         : nodes_tested,
+         "nodes_discarded"      : nodes_discarded,
+         "distinct_states_seen" : distinct_states_seen,
+         "nodes_left_in_queue"  : len(stack),
+         "time_taken"           : time.perf_counter() - monitor.start_time,
+         "iterations"           : iterations,
+         }
+    return termination_condition, node, search_stats
+
+
+# In[49]:
+
+
+## Bidirectional breadth-first search ('BD/BFS' mode). A forward search
+## from the initial state and a backward search from all the goal states
+## (problem.goal_states, expanded with problem.predecessors) take turns to
+## expand a whole layer, always the side with the smaller frontier. Each
+## new node is looked up among the nodes seen by the other side (by
+## problem.meet_key, then problem.meets). Once a layer has produced a
+## meeting, the shortest of its joined paths is a shortest solution.
+##
+## The joined path is replayed forward from the meeting node to check it
+## and to build the goal node. Both sides always discard states they have
+## already seen, so loop_check does not apply. Path lengths count actions,
+## so a cost function or heuristic cannot be used.
+
+def bidirectional_search( problem, max_nodes, randomise, cost, heuristic, monitor ):
+    if cost or heuristic:
+        raise ValueError("!!! search mode 'BD/BFS' does not take a cost or heuristic")
+
+    state_key = problem.state_key
+    meet_key = problem.meet_key
+
+    forward = [SearchNode(problem.initial_state)]
+    backward = [SearchNode(state) for state in problem.goal_states()]
+    # Nodes seen by each side, by state key (for discarding repeats) and
+    # by meet key (for finding meetings).
+    seen = ( {state_key(forward[0].state)}, set() )
+    meeting = ( {meet_key(forward[0].state): [forward[0]]}, {} )
+    for node in backward:
+        seen[1].add(state_key(node.state))
+        meeting[1].setdefault(meet_key(node.state), []).append(node)
+
+    nodes_generated = len(forward) + len(backward)
+    nodes_tested = 0
+    nodes_discarded = 0
+    node = None
+    best = None
+    termination_condition = None
+
+    nodes_tested += 1
+    if problem.goal_test(problem.initial_state):
+        node = forward[0]
+        termination_condition = "GOAL_STATE_FOUND"
+
+    def joined(forward_node, backward_node):
+        # Follow the backward node's actions on from the forward node
+        node = forward_node
+        b = backward_node
+        while b.parent is not None:
+            if b.action not in problem.possible_actions(node.state):
+                return None
+            node = SearchNode(problem.successor(node.state, b.action), node, b.action)
+            b = b.parent
+        return node if problem.goal_test(node.state) else None
+
+    while termination_condition is None:
+        if not forward or not backward:
+            termination_condition = "SEARCH-SPACE_EXHAUSTED"
+            break
+
+        side = 0 if len(forward) <= len(backward) else 1
+        frontier = (forward, backward)[side]
+        next_frontier = []
+        for parent in frontier:
+            if nodes_tested >= monitor.next_check:
+                stop = monitor.check( nodes_tested, nodes_generated, nodes_tested,
+                                     len(forward) + len(backward) + len(next_frontier),
+                                     len(seen[0]) + len(seen[1]) )
+                if stop:
+                    termination_condition = stop
+                    break
+            nodes_tested += 1
+            if side == 0:
+                steps = [(action, problem.successor(parent.state, action))
+                         for action in problem.possible_actions(parent.state)]
+            else:
+                steps = problem.predecessors(parent.state)
+            if randomise:
+                random.shuffle(steps)
+            for action, state in steps:
+                nodes_generated += 1
+                key = state_key(state)
+                if key in seen[side]:
+                    nodes_discarded += 1
+                    continue
+                seen[side].add(key)
+                child = SearchNode(state, parent, action)
+                next_frontier.append(child)
+                for other in meeting[1-side].get(meet_key(state), ()):
+                    if side == 0:
+                        pair = (child, other)
+                    else:
+                        pair = (other, child)
+                    if problem.meets(pair[0].state, pair[1].state):
+                        goal_node = joined(*pair)
+                        if goal_node and (best is None or goal_node.depth < best.depth):
+                            best = goal_node
+                meeting[side].setdefault(meet_key(state), []).append(child)
+            if nodes_generated > max_nodes:
+                termination_condition = "NODE_LIMIT_EXCEEDED"
+                break
+
+        if side == 0:
+            forward = next_frontier
+        else:
+            backward = next_frontier
+
+        if best is not None:
+            node = best
+            termination_condition = "GOAL_STATE_FOUND"
+
+    search_stats = {
+         "nodes_generated"      : nodes_generated,
+         "nodes_tested"         : nodes_tested,
+         "nodes_discarded"      : nodes_discarded,
+         "distinct_states_seen" : len(seen[0]) + len(seen[1]),
+         "nodes_left_in_queue"  : len(forward) + len(backward),
+         "time_taken"           : time.perf_counter() - monitor.start_time,
+         }
+    return termination_condition, node, search_stats
+
+
+## Wraps a batch heuristic so that it can be called on one state
+def single_state_heuristic( batch_heuristic ):
+    def heuristic(state):
+        return batch_heuristic([state])[0]
+    heuristic.__name__ = batch_heuristic.__name__
+    return heuristic
+
 
+## Returns a function giving the queue weight of a SearchNode. The node's
+## g value already holds the result of the cost function (see search).
 
 def node_weight_function( cost, heuristic ):    
         if not cost and not heuristic:
-            return lambda p,s: None
+            return lambda n: None
         if cost and (not heuristic):
-            return cost
+            return lambda n: n.g
         if (not cost) and heuristic:
-            return lambda p,s: (heuristic(s))
+            return lambda n: (heuristic(n.state))
         if cost and heuristic:
-            return lambda p,s:(cost(p,s)+heuristic(s))
+            return lambda n:(n.g+heuristic(n.state))
             
     
 
 
+# In[50]:
+
+
+## Portfolio search: race several search strategies on the same problem,
+## each in its own process, and return as soon as one finds a goal. The
+## other processes are then stopped.
+##
+## Each strategy is a dict giving a "name", a "mode" and any other keyword
+## arguments of search (e.g. "cost", "heuristic", "randomise", "loop_check").
+## A heuristic made by a closure cannot be sent to another process, so it
+## can instead be given as "heuristic_factory" (e.g. make_misplaced) with
+## "heuristic_args" (e.g. (goal,)), and it is then built in the worker. A
+## "seed" sets the random seed of the worker, so the same randomised
+## strategy can be run several times with different seeds.
+##
+## Returns (strategy name, return_info) for the first strategy to find a
+## goal, or (None, None) if none does within max_time seconds.
+
+from queue import Empty
+
+## Keyword arguments of search for a strategy dict (without its "mode"),
+## building the heuristic and setting the seed if given. The "name" of
+## the strategy is only a label and is dropped. This is called in the
+## worker process.
+def strategy_options( strategy ):
+    options = dict(strategy)
+    options.pop("name", None)
+    factory = options.pop("heuristic_factory", None)
+    factory_args = options.pop("heuristic_args", ())
+    if factory:
+        options["heuristic"] = factory(*factory_args)
+    seed = options.pop("seed", None)
+    if seed is not None:
+        random.seed(seed)
+    return options
+
+## Puts (name, return_info, None) on results, or (name, None, error
+## message) if the strategy raised an exception, so the parent always
+## hears back from every worker.
+def portfolio_worker( problem, strategy, max_nodes, max_time, results ):
+    options = dict(strategy)
+    name = options.pop("name")
+    try:
+        mode = options.pop("mode")
+        info = search( problem, mode, max_nodes, verbose=0, return_info=True,
+                       max_time=max_time, **strategy_options(options) )
+    except Exception as e:
+        results.put( (name, None, f"{type(e).__name__}: {e}") )
+        return
+    results.put( (name, info, None) )
+
+def search_portfolio( problem, strategies, max_time=300, max_nodes=10000000 ):
+    import multiprocessing   # only imported when needed: it is slow to import
+    print( "\n** Running portfolio of", len(strategies), "search strategies **" )
+    start_time = time.perf_counter()
+    results = multiprocessing.Queue()
+    workers = [ multiprocessing.Process( target=portfolio_worker,
+                                         args=(problem, strategy, max_nodes, max_time, results),
+                                         daemon=True )
+                for strategy in strategies ]
+    for worker in workers:
+        worker.start()
+
+    winner = (None, None)
+    try:
+        for finished in range(len(workers)):
+            remaining = max_time - (time.perf_counter() - start_time)
+            try:
+                name, info, error = results.get(timeout=max(remaining, 0) + 1)
+            except Empty:  # every strategy has run out of time
+                break
+            if error is not None:
+                print( f"{name}: failed ({error})" )
+                continue
+            print( f"{name}: {info['result']['termination_condition']}" )
+            if info["result"]["termination_condition"] == "GOAL_STATE_FOUND":
+                winner = (name, info)
+                break
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join()
+
+    name, info = winner
+    if name is None:
+        print( "\n): No strategy found a solution :(\n" )
+    else:
+        print( f"\n:-)) Strategy {name} found a solution of length "
+               f"{info['result']['path_length']} ((-:" )
+    print( f"Wall clock time = {round(time.perf_counter() - start_time, 4)} seconds\n" )
+    return winner
+
+
 # In[46]:
 
 
@@ -562,12 +1390,21 @@ def test():
 
 
     
+    # A search stopped before it has tested any node must still return a
+    # result. ('BD/BFS' is not checked: JugPouringPuzzle has no goal_states.)
+    for mode in ['BF/FIFO', 'DF/LIFO', 'IDA*', 'ID/DFS', 'DL/DFS']:
+        res = search( JPP1, mode, 10000, max_time=0, depth_limit=10,
+                      verbose=0, return_info=True )
+        assert res["result"]["termination_condition"] == "TIME_LIMIT_EXCEEDED", mode
+    print("max_time=0 gives TIME_LIMIT_EXCEEDED in every mode")
+
     res1 = search( JPP1, 'BF/FIFO', 10000, cost=thecost, loop_check=False, show_state_path=True )
     print("res1 =");  display(res1)
     res2 = search( JPP2, 'DF/LIFO', 10000, 
                   #dots = False,
                   randomise=True, loop_check=False, return_info=True)
     print("res2 ="); display(res2)
+
     
 if __name__ == "__main__":
     test()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Compare the object based RobotWorker engines (classes / classes_battery)
+with the bitmask engine (classes_bitmask) on the cases in config.json.
+
+For every case, rules variant and strategy both engines are run with the
+same limits, and the table shows the result, path length, nodes tested
+and expansions per second. For the optimal strategies (bfs and A*) rows
+where the engines disagree on the result or path length are flagged.
+Depth-first runs are not compared: the engines generate actions in a
+different order (the bitmask engine lists items in ascending id order),
+so DFS explores a different part of the space.
+
+Before the searches, both engines are also asked for the possible actions
+of every state met on a number of seeded random walks (taken with the
+object engine, and encoded for the bitmask one); a case where the two
+action sets differ for any state is flagged.
+
+Usage: python benchmark.py [case ...] [--max-nodes N] [--max-time T] [--walks N]
+"""
+import argparse
+import random
+
+import classes
+import classes_battery
+import classes_bitmask
+import heuristics
+import heuristics_battery
+from bbSearch import search
+from case_compiler import load_compiled_config
+from costs import cost
+
+
+# rules variant -> (classes module, heuristics module, bitmask battery_rules)
+RULES = {
+    "standard": (classes, heuristics, False),
+    "battery":  (classes_battery, heuristics_battery, True),
+}
+
+# name, mode, use A* (cost + misplaced heuristic), optimal
+STRATEGIES = [
+    ("bfs", "BF/FIFO", False, True),
+    ("dfs", "DF/LIFO", False, False),
+    ("A*",  "BF/FIFO", True,  True),
+]
+
+
+def make_problems(case, items, rules):
+    module, heuristic_module, battery_rules = RULES[rules]
+    state, goal = case.initial_state(module, items), case.goal()
+    object_problem = module.RobotWorker(state, goal)
+    bitmask_problem = classes_bitmask.RobotWorker(state, goal, battery_rules=battery_rules)
+    return [("object", object_problem, heuristic_module.make_misplaced(goal)),
+            ("bitmask", bitmask_problem, bitmask_problem.misplaced)]
+
+
+## Walk the object engine's states at random (walks walks of up to steps
+## actions) and count the states where the two engines disagree on the
+## set of possible actions. Returns (states checked, states that differ).
+def compare_actions(object_problem, bitmask_problem, walks=50, steps=40, seed=0):
+    rng = random.Random(seed)
+    checked = differ = 0
+    for walk in range(walks):
+        state = object_problem.initial_state
+        for step in range(steps):
+            actions = object_problem.possible_actions(state)
+            checked += 1
+            if set(actions) != set(bitmask_problem.possible_actions(bitmask_problem.encode(state))):
+                differ += 1
+            if not actions:
+                break
+            state = object_problem.successor(state, rng.choice(actions))
+    return checked, differ
+
+
+def run(problem, mode, astar, heuristic, max_nodes, max_time):
+    return search(problem, mode, max_nodes,
+                  loop_check=True,
+                  cost=cost if astar else None,
+                  heuristic=heuristic if astar else None,
+                  verbose=0,
+                  return_info=True,
+                  max_time=max_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("cases", nargs="*", help="case names (default: all cases)")
+    parser.add_argument("--max-nodes", type=int, default=200000)
+    parser.add_argument("--max-time", type=float, default=60)
+    parser.add_argument("--walks", type=int, default=50,
+                        help="random walks per case on which the action sets are compared")
+    args = parser.parse_args()
+
+    config = load_compiled_config()
+    if args.cases:
+        cases = args.cases
+    else:
+        # Cases with errors in config.json are reported and left out
+        cases = []
+        for case_name, case in config.cases.items():
+            if case.error is not None:
+                print("skipped:", case.error)
+            else:
+                cases.append(case_name)
+
+    header = (f"{'case':<13}{'rules':<10}{'strategy':<9}{'engine':<9}{'result':<22}"
+              f"{'path':>6}{'tested':>9}{'time':>9}{'exp/s':>10}")
+    print(header)
+    print("-" * len(header))
+    for case_name in cases:
+        case = config.cases[case_name]
+        for rules in RULES:
+            problems = make_problems(case, config.items, rules)
+            checked, differ = compare_actions(problems[0][1], problems[1][1], args.walks)
+            if differ:
+                print(f"  !! action sets differ in {differ} of {checked} states ({case_name}, {rules})")
+            for name, mode, astar, optimal in STRATEGIES:
+                outcomes = []
+                for engine, problem, heuristic in problems:
+                    info = run(problem, mode, astar, heuristic, args.max_nodes, args.max_time)
+                    result = info['result']
+                    stats = info['search_stats']
+                    rate = stats['nodes_tested'] / stats['time_taken'] if stats['time_taken'] else 0
+                    print(f"{case_name:<13}{rules:<10}{name:<9}{engine:<9}"
+                          f"{result['termination_condition']:<22}"
+                          f"{str(result['path_length']):>6}{stats['nodes_tested']:>9}"
+                          f"{stats['time_taken']:>9.3f}{rate:>10.0f}")
+                    outcomes.append((result['termination_condition'], result['path_length']))
+                if optimal and outcomes[0] != outcomes[1]:
+                    print("  !! engines disagree:", outcomes)
+
+
+if __name__ == "__main__":
+    main()
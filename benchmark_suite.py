@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmark every case in config.json with every strategy of main.py
+(standard rules) and main_battery.py (battery rules), and write the
+results as JSON and CSV.
+
+Each run is done in a fresh process, so that its peak RSS is its own.
+For every run the harness records the result, path length, nodes
+generated and tested, expansions per second (nodes tested per second of
+search time), peak RSS and wall time. A run is repeated --repeat times,
+and the median and variance of each measure are reported.
+
+With --baseline FILE the results are compared with an earlier results
+file. Rows whose termination condition, path length or node counts have
+changed, or whose median search time (or, for runs stopped by the time
+limit and randomised runs, expansion rate) is more than --tolerance
+worse, are flagged, and the exit status is 1.
+
+Usage: python benchmark_suite.py [case ...] [--rules standard|battery]
+           [--repeat N] [--max-nodes N] [--max-time T]
+           [--baseline FILE] [--tolerance F] [--output PREFIX]
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+import main_battery
+from bbSearch import search
+
+# rules variant -> module with build_case() and get_search_strategies()
+RULES = {
+    "standard": main,
+    "battery": main_battery,
+}
+
+MEASURES = ["nodes_generated", "nodes_tested", "time_taken", "exp_per_sec",
+            "peak_rss_kb", "wall_time"]
+
+# Search times below this (in seconds) are not compared with the baseline
+MIN_TIMED = 0.05
+
+
+def strategy_label(strategy):
+    return f"{strategy['name']}/{strategy['heuristic_name']}/{strategy['cost_name']}"
+
+
+def run_one(rules, case_name, strategy_index, max_nodes, max_time):
+    """Run one strategy on one case. This is run in a fresh worker process,
+    so ru_maxrss is the peak RSS of this run only."""
+    module = RULES[rules]
+    initial_state, goal = module.build_case(module.load_config().cases[case_name])
+    strategy = module.get_search_strategies(goal)[strategy_index]
+    problem = module.RobotWorker(initial_state, goal)
+    # Heuristics such as the pattern database build their tables on the
+    # first call; do that before the timed search.
+    if strategy.get('heuristic'):
+        strategy['heuristic'](initial_state)
+
+    wall_start = time.perf_counter()
+    info = search(problem, strategy['mode'], max_nodes,
+                  loop_check=True,
+                  randomise=strategy['randomise'],
+                  cost=strategy.get('cost'),
+                  heuristic=strategy.get('heuristic'),
+                  tt_size=strategy.get('tt_size', 0),
+                  verbose=0,
+                  return_info=True,
+                  max_time=max_time)
+    wall_time = time.perf_counter() - wall_start
+
+    stats = info['search_stats']
+    return {
+        "termination_condition": info['result']['termination_condition'],
+        "path_length": info['result']['path_length'],
+        "nodes_generated": stats['nodes_generated'],
+        "nodes_tested": stats['nodes_tested'],
+        "time_taken": stats['time_taken'],
+        "exp_per_sec": stats['nodes_tested'] / stats['time_taken'] if stats['time_taken'] else 0,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "wall_time": wall_time,
+    }
+
+
+def summarise(runs):
+    """Median and variance of each measure over the repeated runs."""
+    conditions = [run["termination_condition"] for run in runs]
+    row = {"termination_condition": statistics.mode(conditions),
+           "path_length": runs[conditions.index(statistics.mode(conditions))]["path_length"],
+           "repeats": len(runs),
+           "timed_out_runs": conditions.count("TIME_LIMIT_EXCEEDED")}
+    for measure in MEASURES:
+        values = [run[measure] for run in runs]
+        row[measure] = statistics.median(values)
+        row[measure + "_var"] = statistics.pvariance(values) if len(values) > 1 else 0.0
+    return row
+
+
+def compare(rows, baseline, tolerance):
+    """Return a list of (row key, reason) for rows that have regressed.
+
+    A run that found a goal before must still find one, of the same length.
+    Node counts are only compared for runs never stopped by the time limit.
+    Search times under MIN_TIMED seconds are too noisy to compare;
+    time-limited runs are compared by expansions per second instead.
+    Randomised strategies are unseeded, so their result, length, node
+    counts and time differ from run to run: they are only compared by
+    expansions per second."""
+    flags = []
+    for key, row in rows.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if row["randomise"]:
+            if (old["time_taken"] >= MIN_TIMED
+                    and row["exp_per_sec"] < old["exp_per_sec"] / (1 + tolerance)):
+                flags.append((key, f"exp_per_sec {old['exp_per_sec']:.0f} -> {row['exp_per_sec']:.0f}"))
+            continue
+        if old["termination_condition"] == "GOAL_STATE_FOUND":
+            if row["termination_condition"] != "GOAL_STATE_FOUND":
+                flags.append((key, f"termination_condition GOAL_STATE_FOUND -> {row['termination_condition']}"))
+            elif row["path_length"] != old["path_length"]:
+                flags.append((key, f"path_length {old['path_length']} -> {row['path_length']}"))
+        timed_out = row["timed_out_runs"] or old["timed_out_runs"]
+        if not timed_out:
+            for field in ["nodes_generated", "nodes_tested"]:
+                if row[field] != old[field]:
+                    flags.append((key, f"{field} {old[field]} -> {row[field]}"))
+        if timed_out:
+            if row["exp_per_sec"] < old["exp_per_sec"] / (1 + tolerance):
+                flags.append((key, f"exp_per_sec {old['exp_per_sec']:.0f} -> {row['exp_per_sec']:.0f}"))
+        elif old["time_taken"] >= MIN_TIMED and row["time_taken"] > old["time_taken"] * (1 + tolerance):
+            flags.append((key, f"time_taken {old['time_taken']:.4f} -> {row['time_taken']:.4f}"))
+    return flags
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("cases", nargs="*", help="case names (default: all cases)")
+    parser.add_argument("--rules", choices=list(RULES), action="append",
+                        help="rules variants to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-nodes", type=int, default=1000000)
+    parser.add_argument("--max-time", type=float, default=10)
+    parser.add_argument("--baseline", help="results JSON file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed fractional slow-down before flagging (default 0.25)")
+    parser.add_argument("--output", help="output file prefix (default results/benchmark_<timestamp>)")
+    args = parser.parse_args()
+
+    config = main.load_config()
+    if args.cases:
+        cases = args.cases
+    else:
+        # Cases with errors in config.json are reported and left out
+        cases = []
+        for case_name, case in config.cases.items():
+            if case.error is not None:
+                print("skipped:", case.error)
+            else:
+                cases.append(case_name)
+    rules_list = args.rules or list(RULES)
+
+    # Each job gets its own process (max_tasks_per_child=1), and jobs are
+    # run one at a time so that timings do not compete for cores.
+    rows = {}
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        for rules in rules_list:
+            module = RULES[rules]
+            for case_name in cases:
+                initial_state, goal = module.build_case(module.load_config().cases[case_name])
+                if goal is None:
+                    continue
+                for index, strategy in enumerate(module.get_search_strategies(goal)):
+                    runs = [executor.submit(run_one, rules, case_name, index,
+                                            args.max_nodes, args.max_time).result()
+                            for repeat in range(args.repeat)]
+                    row = summarise(runs)
+                    key = f"{rules}:{case_name}:{index}:{strategy_label(strategy)}"
+                    rows[key] = dict(rules=rules, case=case_name, strategy=strategy_label(strategy),
+                                     randomise=strategy['randomise'], **row)
+                    print(f"{rules:<9}{case_name:<13}{strategy_label(strategy):<32}"
+                          f"{row['termination_condition']:<22}{str(row['path_length']):>5}"
+                          f"{row['nodes_generated']:>10.0f}{row['time_taken']:>9.3f}"
+                          f"{row['exp_per_sec']:>10.0f}{row['peak_rss_kb']:>10.0f}", flush=True)
+
+    prefix = args.output or f'results/benchmark_{time.strftime("%Y%m%d_%H%M%S")}'
+    if os.path.dirname(prefix):
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    with open(prefix + ".json", 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=1)
+    with open(prefix + ".csv", 'w', encoding='utf-8', newline='') as f:
+        fields = ["rules", "case", "strategy", "randomise", "termination_condition",
+                  "path_length", "repeats", "timed_out_runs"]
+        fields += [name for measure in MEASURES for name in (measure, measure + "_var")]
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows.values())
+    print(f"\nResults saved to {prefix}.json and {prefix}.csv")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        flags = compare(rows, baseline, args.tolerance)
+        for key, reason in flags:
+            print(f"  !! {key}: {reason}")
+        print(f"{len(flags)} regression(s) against {args.baseline}")
+        if flags:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
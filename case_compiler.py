@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import pickle
+
+from item_table import CACHE_ROOT, CONFIG_PATH, ItemTable, atomic_write
+
+## Case compiler for config.json.
+##
+## Every case is checked once and turned into a CompiledCase: rooms are
+## numbered, room contents and goals become item bitmasks, each door is a
+## (room, room, key, locked) tuple of integers and each room has a list of
+## (neighbour, door index) pairs. Together with the ItemTable of the
+## config this is everything the runners need, and the object states are
+## built from it without touching the JSON again.
+##
+## The compiled config is pickled to CASE_DIR under a hash of the config
+## file's bytes, so a later run (or another worker process) only reads and
+## hashes the file and then loads the pickle. Any edit to config.json gives
+## a new hash, and so a fresh compile.
+
+CASE_DIR = os.path.join(CACHE_ROOT, "case_cache")
+COMPILER_VERSION = 2   # bump when the compiled form changes
+NO_KEY = -1
+
+
+def to_mask(items):
+    mask = 0
+    for i in items:
+        mask |= 1 << i
+    return mask
+
+
+def mask_items(mask):
+    """The item ids in mask, in ascending order."""
+    items = []
+    while mask:
+        low = mask & -mask
+        items.append(low.bit_length() - 1)
+        mask ^= low
+    return items
+
+
+class CompiledCase:
+
+    def __init__( self, name, case_data, n_items ):
+        self.name = name
+        # Hash of the case itself, so that results can be keyed on what
+        # the case is rather than what it is called.
+        self.signature = hashlib.sha256(
+            json.dumps(case_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+        # A case that does not check out keeps its error message rather than
+        # raising, so that one bad case does not stop the others from being
+        # compiled; check() raises it when the case is used.
+        self.error = None
+        try:
+            self.compile(case_data, n_items)
+        except ValueError as e:
+            self.error = str(e)
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            self.error = f"case {name}: malformed case ({type(e).__name__}: {e})"
+
+    def compile( self, case_data, n_items ):
+        name = self.name
+        contents = case_data["room contents"]
+        self.rooms = list(contents)
+        self.room_index = {room: n for n, room in enumerate(self.rooms)}
+
+        placed = set()
+        def check_items(items, where):
+            for i in items:
+                if not isinstance(i, int) or not 0 <= i < n_items:
+                    raise ValueError(f"case {name}: unknown item {i!r} in {where}")
+                if i in placed:
+                    raise ValueError(f"case {name}: item {i} is in more than one place")
+                placed.add(i)
+
+        self.room_masks = []
+        for room in self.rooms:
+            check_items(contents[room], room)
+            self.room_masks.append(to_mask(contents[room]))
+
+        robot = case_data.get("robot", {})
+        self.robot_location = self.index(robot.get("location", self.rooms[0]), "robot location")
+        self.robot_carried = tuple(robot.get("carried_items", []))
+        check_items(self.robot_carried, "robot")
+        self.robot_strength = robot.get("strength", 10)
+
+        self.doors = []
+        self.adjacent = [[] for room in self.rooms]
+        for n, (room_a, room_b, doorkey, locked) in enumerate(case_data.get("doors") or []):
+            a = self.index(room_a, f"door {n}")
+            b = self.index(room_b, f"door {n}")
+            if doorkey is not None and not 0 <= doorkey < n_items:
+                raise ValueError(f"case {name}: door {n} has unknown key {doorkey!r}")
+            self.doors.append( (a, b, NO_KEY if doorkey is None else doorkey, bool(locked)) )
+            self.adjacent[a].append( (b, n) )
+            self.adjacent[b].append( (a, n) )
+
+        # Goal as (room index, item mask) for each room with goal items, or
+        # None if the case defines no goal.
+        self.goal_masks = None
+        goal = case_data.get("goal")
+        if goal:
+            self.goal_masks = []
+            for room, items in goal.items():
+                if items:
+                    if any(not isinstance(i, int) or not 0 <= i < n_items for i in items):
+                        raise ValueError(f"case {name}: unknown goal item in {room}")
+                    self.goal_masks.append( (self.index(room, "goal"), to_mask(items)) )
+
+    def index( self, room, where ):
+        if room not in self.room_index:
+            raise ValueError(f"case {self.name}: unknown room {room!r} in {where}")
+        return self.room_index[room]
+
+    def check( self ):
+        if self.error is not None:
+            raise ValueError(self.error)
+
+    ## Goal dict in the form used by the RobotWorker engines
+    def goal( self ):
+        self.check()
+        if self.goal_masks is None:
+            return None
+        return {self.rooms[room]: set(mask_items(mask)) for room, mask in self.goal_masks}
+
+    ## Initial State built with the Robot, Door and State classes of module
+    ## (classes or classes_battery). The robot's location, strength and
+    ## carried items can be given instead of those of the case.
+    def initial_state( self, module, items, location=None, strength=None, carried=None ):
+        self.check()
+        doors = [ module.Door(self.rooms[a], self.rooms[b], None if key == NO_KEY else key, locked, items)
+                  for a, b, key, locked in self.doors ]
+        room_contents = {room: set(mask_items(mask)) for room, mask in zip(self.rooms, self.room_masks)}
+        robot = module.Robot( self.rooms[self.robot_location] if location is None else location,
+                              self.robot_carried if carried is None else carried,
+                              self.robot_strength if strength is None else strength,
+                              items=items )
+        return module.State(robot, doors, room_contents)
+
+
+class CompiledConfig:
+
+    def __init__( self, config_data, signature ):
+        self.signature = signature
+        self.items = ItemTable(config_data["items"])
+        self.items_signature = hashlib.sha256(
+            json.dumps(config_data["items"], sort_keys=True).encode("utf-8")).hexdigest()
+        self.cases = { name: CompiledCase(name, case_data, len(self.items))
+                       for name, case_data in config_data["cases"].items() }
+
+
+_compiled = {}   # path -> (mtime, CompiledConfig)
+
+## The compiled form of the config file at path (by default the same
+## config.json next to the code that load_item_table reads), from this
+## process's memory if the file has not changed, else from CASE_DIR, else
+## compiled afresh (and saved to CASE_DIR).
+def load_compiled_config(path=CONFIG_PATH, cache_dir=CASE_DIR):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _compiled.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        data = f.read()
+    signature = hashlib.sha256(data).hexdigest()[:16]
+    cache_path = (os.path.join(cache_dir, f"cases_v{COMPILER_VERSION}_{signature}.pickle")
+                  if cache_dir else None)
+    compiled = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                compiled = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            compiled = None
+    if compiled is None:
+        compiled = CompiledConfig(json.loads(data.decode("utf-8")), signature)
+        if cache_path:
+            atomic_write(cache_path, lambda f: pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    _compiled[path] = (mtime, compiled)
+    return compiled
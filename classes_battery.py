@@ -1,53 +1,105 @@
 from bbSearch import SearchProblem, search
-from copy import deepcopy
-import json
+from item_table import ITEM_BATTERY, load_item_table
 
-items = json.load(open("./config.json"))["items"]
-ITEM_WEIGHT = [i["weight"] for i in items]
-ITEM_NAME = [i["name"] for i in items]
+## Item weights, names and categories come from the ItemTable each robot
+## carries (see item_table.py). A robot made without one uses the table
+## of config.json, which is only read then. The old module-level lists
+## are still available, from that same default table.
+
+_DEFAULT_TABLE_NAMES = { "ITEM_WEIGHT"   : "weight",
+                         "ITEM_NAME"     : "name",
+                         "ITEM_FLAGS"    : "flags",
+                         "BATTERY_ITEMS" : "battery_items" }
+
+def __getattr__(name):
+    if name in _DEFAULT_TABLE_NAMES:
+        return getattr(load_item_table(), _DEFAULT_TABLE_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+## Robot, Door and State objects are never modified once created.
+## successor() builds a new State that shares every component the
+## action does not change with its parent, instead of deep copying.
 
 class Robot:
-    def __init__(self, location, carried_items, strength):
+    def __init__(self, location, carried_items, strength, weight=None, has_battery=None, items=None):
         self.location      = location
-        self.carried_items = carried_items
+        self.carried_items = tuple(carried_items)
         self.strength      = strength
+        self.items         = items if items is not None else load_item_table()
+        # The carried weight and battery flag are passed on by successor(),
+        # so they are only worked out from scratch for a new robot.
+        if weight is None:
+            weight = round(sum([self.items.weight[i] for i in self.carried_items]), 1)
+        if has_battery is None:
+            has_battery = not self.items.battery_items.isdisjoint(self.carried_items)
+        self.weight        = weight
+        self.has_battery   = has_battery
 
     def weight_carried(self):
-        return sum([ITEM_WEIGHT[i] for i in self.carried_items])
+        return self.weight
 
     ## Define unique string representation for the state of the robot object
     def __repr__(self):
         return str( ( self.location,
-                      ", ".join(ITEM_NAME[i] for i in self.carried_items ),
+                      ", ".join(self.items.name[i] for i in self.carried_items ),
                       self.strength ) )
 
 
 class Door:
-    def __init__(self, roomA, roomB, doorkey=None, locked=False):
+    def __init__(self, roomA, roomB, doorkey=None, locked=False, items=None):
         self.goes_between = {roomA, roomB}
         self.doorkey      = doorkey
+        self.items        = items   # only used to name the key
+        # Initial lock status: once a State is built, whether the door is
+        # locked is held in the state's `locked` bitmask.
         self.locked       = locked
         # Define handy dictionary to get room on other side of a door
         self.other_loc = {roomA:roomB, roomB:roomA}
 
     ## Define a unique string representation for a door object
     def __repr__(self):
-        return str( ("door", self.goes_between, ITEM_NAME[self.doorkey] if self.doorkey != None else None, self.locked) )
+        return self.describe(self.locked)
+
+    def describe(self, locked):
+        names = (self.items or load_item_table()).name
+        return str( ("door", self.goes_between, names[self.doorkey] if self.doorkey != None else None, locked) )
     
 
+## The doors tuple only describes the (fixed) building layout and is
+## shared by all states; the state itself tracks which doors are locked
+## as a bitmask over door indexes.
+
 class State:
     def __init__( self, robot, doors, room_contents ):
         self.robot = robot
-        self.doors = doors
-        self.room_contents = room_contents
+        self.doors = tuple(doors)
+        self.locked = 0
+        for n, door in enumerate(self.doors):
+            if door.locked:
+                self.locked |= 1 << n
+        self.room_contents = {room: frozenset(items) for room, items in room_contents.items()}
+        self.key = None   # filled in by RobotWorker.state_key
+
+    def door_locked( self, n ):
+        return bool(self.locked >> n & 1)
+
+    ## Return a new state sharing all components that are not given
+    def replace( self, robot=None, locked=None, room_contents=None ):
+        new_state = State.__new__(State)
+        new_state.robot = self.robot if robot is None else robot
+        new_state.doors = self.doors
+        new_state.locked = self.locked if locked is None else locked
+        new_state.room_contents = self.room_contents if room_contents is None else room_contents
+        new_state.key = None
+        return new_state
 
     ## Define a string representation that will be uniquely identify the state.
     ## An easy way is to form a tuple of representations of the components of
     ## the state, then form a string from that:
     def __repr__(self):
         return str( ( self.robot.__repr__(),
-                      [d.__repr__() for d in self.doors],
-                    dict(zip(self.room_contents.keys(), [("None" if len(self.room_contents[rk])==0 else {ITEM_NAME[v] for v in self.room_contents[rk]}) for rk in self.room_contents.keys()])),
+                      [d.describe(self.door_locked(n)) for n, d in enumerate(self.doors)],
+                    dict(zip(self.room_contents.keys(), [("None" if len(self.room_contents[rk])==0 else {self.robot.items.name[v] for v in self.room_contents[rk]}) for rk in self.room_contents.keys()])),
                     ))
     
 
@@ -56,82 +108,136 @@ class RobotWorker( SearchProblem ):
     def __init__( self, state, goal_item_locations ):
         self.initial_state = state
         self.goal_item_locations = goal_item_locations
+        self.items = state.robot.items
+        # Fixed room order used to build compact state keys
+        self.rooms = list(state.room_contents.keys())
+        # The layout never changes, so index it once: for each room the
+        # (neighbour, door index, door key) of every door leading out of
+        # it, and for each pair of rooms the mask of doors between them.
+        self.adjacent = {room: [] for room in self.rooms}
+        self.doors_between = {}
+        self.door_keys = [door.doorkey for door in state.doors]
+        for n, door in enumerate(state.doors):
+            for room, neighbour in door.other_loc.items():
+                self.adjacent[room].append( (neighbour, n, door.doorkey) )
+                self.doors_between[room, neighbour] = self.doors_between.get((room, neighbour), 0) | 1 << n
 
     def possible_actions( self, state ):
 
         robot_location = state.robot.location
-        strength       = state.robot.strength
-        weight_carried = state.robot.weight_carried()
+        # 力量和重量都换算成整数（单位为0.1）再比较，避免浮点误差；
+        # classes_bitmask 的电池规则使用同样的整数比较，两者的动作完全一致
+        strength       = round(state.robot.strength * 10)
+        weight_carried = round(state.robot.weight_carried() * 10)
+        item_weight    = self.items.mask_tables()[0]
+        item_flags     = self.items.flags
 
         actions = []
         # Can put down any carried item
         for i in state.robot.carried_items:
             # 特殊处理电池：放下电池会减少10点strength
-            if ITEM_NAME[i] == "Battery":
+            if item_flags[i] & ITEM_BATTERY:
                 # 确保放下电池后strength减10再减0.1后仍足够支撑剩余物品
-                if strength - 10 - 0.1 >= weight_carried - ITEM_WEIGHT[i]:
+                if strength - 100 - 1 >= weight_carried - item_weight[i]:
                     actions.append( ("put down", i) )
             else:
-                if strength - 0.1 >= weight_carried - ITEM_WEIGHT[i]:
+                if strength - 1 >= weight_carried - item_weight[i]:
                     actions.append( ("put down", i) )
 
         # Can pick up any item in room if strong enough
         for i in state.room_contents[robot_location]:
             # 特殊处理电池：拾取电池会增加10点strength
-            if ITEM_NAME[i] == "Battery":
+            if item_flags[i] & ITEM_BATTERY:
                 # 拾取电池后，strength会增加10再减0.1，所以条件更宽松
-                if strength + 10 - 0.1 >= weight_carried + ITEM_WEIGHT[i]:
+                if strength + 100 - 1 >= weight_carried + item_weight[i]:
                     actions.append( ("pick up", i))
             else:
-                if strength - 0.1 >= weight_carried + ITEM_WEIGHT[i]:
+                if strength - 1 >= weight_carried + item_weight[i]:
                     actions.append( ("pick up", i))
 
         # If there is an unlocked door between robot location and
         # another location can move to that location
-        for door in state.doors:
-            # 确保执行移动动作后，机器人的strength仍然足以支撑其携带的物品重量
-            if strength - 0.1 >= weight_carried:
-                if door.locked==False and robot_location in door.goes_between:
-                    actions.append( ("move to", door.other_loc[robot_location]) )
+        # 确保执行移动动作后，机器人的strength仍然足以支撑其携带的物品重量
+        if strength - 1 >= weight_carried:
+            for neighbour, n, doorkey in self.adjacent[robot_location]:
+                if not state.locked >> n & 1:
+                    actions.append( ("move to", neighbour) )
                 # If the door is locked, check if the robot has the key
-                if door.locked==True and robot_location in door.goes_between:
-                    if door.doorkey in state.robot.carried_items:
-                        # If the robot has the key, it can move through the door
-                        actions.append( ("move to", door.other_loc[robot_location]) )
+                elif doorkey in state.robot.carried_items:
+                    # If the robot has the key, it can move through the door
+                    actions.append( ("move to", neighbour) )
 
         # Now the actions list should contain all possible actions
         return actions
 
     def successor( self, state, action):
-        next_state = deepcopy(state)
         act, target = action
+        robot = state.robot
+        robot_location = robot.location
+        carried_items  = robot.carried_items
+        weight         = robot.weight
+        has_battery    = robot.has_battery
+        strength       = robot.strength
+        room_contents  = state.room_contents
+        locked         = state.locked
+        items          = robot.items
         if act== "put down":
-            next_state.robot.carried_items.remove(target)
-            next_state.room_contents[state.robot.location].add(target)
+            carried_items = list(carried_items)
+            carried_items.remove(target)
+            # Summed again rather than subtracted, so float rounding cannot drift
+            weight = round(sum([items.weight[i] for i in carried_items]), 1)
+            if target in items.battery_items:
+                has_battery = not items.battery_items.isdisjoint(carried_items)
+            room_contents = dict(room_contents)
+            room_contents[robot_location] = room_contents[robot_location] | {target}
             # 如果是电池，放下后降低strength
-            if ITEM_NAME[target] == "Battery":
-                next_state.robot.strength -= 10  # 放下电池后降低10点strength
+            if items.flags[target] & ITEM_BATTERY:
+                strength -= 10  # 放下电池后降低10点strength
 
         if act == "pick up":
-            next_state.robot.carried_items.append(target)
-            next_state.room_contents[state.robot.location].remove(target)
+            carried_items = carried_items + (target,)
+            weight = round(weight + items.weight[target], 1)
+            has_battery = has_battery or target in items.battery_items
+            room_contents = dict(room_contents)
+            room_contents[robot_location] = room_contents[robot_location] - {target}
             # 如果是电池，拾取后增加strength
-            if ITEM_NAME[target] == "Battery":
-                next_state.robot.strength += 10  # 拾取电池后增加10点strength
+            if items.flags[target] & ITEM_BATTERY:
+                strength += 10  # 拾取电池后增加10点strength
 
         if act == "move to":
-            robot_location = state.robot.location
-            for door in next_state.doors:
-                if robot_location in door.goes_between and target in door.goes_between:
-                    if door.locked == True:
-                        door.locked = False
+            # Going through a door unlocks it (and any other door between the rooms)
+            locked &= ~self.doors_between[robot_location, target]
         
-            next_state.robot.location = target
-
-        # 每次执行动作后减少 strength
-        next_state.robot.strength -= 0.1
-
-        return next_state
+            robot_location = target
+
+        # 每次执行动作后减少 strength。
+        # 保留一位小数：否则浮点误差会累积，state_key 相同（力量按十分之一取整）
+        # 的两个状态可能有不同的可执行动作
+        strength = round(strength - 0.1, 1)
+
+        return state.replace(robot=Robot(robot_location, carried_items, strength, weight, has_battery, items),
+                             locked=locked, room_contents=room_contents)
+
+    ## Compact key used by loop_check: robot location, bitmask of carried
+    ## items, bitmask of locked doors, a bitmask of items for each room and
+    ## the strength in tenths (so float rounding does not split states).
+    ## States never change, so the key is worked out once and kept on the
+    ## state (loop_check and a cached heuristic both ask for it).
+    def state_key(self, state):
+        if state.key is not None:
+            return state.key
+        robot = state.robot
+        carried = 0
+        for i in robot.carried_items:
+            carried |= 1 << i
+        rooms = []
+        for room in self.rooms:
+            mask = 0
+            for i in state.room_contents[room]:
+                mask |= 1 << i
+            rooms.append(mask)
+        state.key = (robot.location, carried, state.locked, tuple(rooms), round(robot.strength * 10))
+        return state.key
 
     def goal_test(self, state):
         #print(state.room_contents)
@@ -143,7 +249,7 @@ class RobotWorker( SearchProblem ):
 
     def display_state(self,state):
         print("Robot location:", state.robot.location)
-        print("Robot carrying:", state.robot.carried_items)
-        print("Room contents:", state.room_contents)
+        print("Robot carrying:", list(state.robot.carried_items))
+        print("Room contents:", {room: set(items) for room, items in state.room_contents.items()})
 
 
@@ -0,0 +1,240 @@
+import itertools
+
+from bbSearch import SearchProblem
+from case_compiler import mask_items, to_mask
+
+## Bitmask encoded RobotWorker.
+##
+## A state is a tuple of small integers:
+##     (location, carried, locked, rooms, strength)
+## where location is a room index, carried is a bitmask of carried item ids,
+## locked is a bitmask of locked door indexes, rooms is a tuple with an item
+## bitmask for each room and strength is in tenths (an int, so there is no
+## float drift). The state is its own loop_check key.
+##
+## The problem is built from the same State objects and goal dict as
+## classes.RobotWorker. With battery_rules=True it follows the rules of
+## classes_battery.RobotWorker (each action costs 0.1 strength and
+## carrying a battery adds 10). Actions have the same form as in the
+## object engines, e.g. ("pick up", 3) or ("move to", "room2"). Item
+## weights (in tenths, with a carried-mask -> total weight table) and the
+## battery mask come from the item table of the initial state's robot.
+
+
+def submasks(mask):
+    """Yield every mask whose set bits are a subset of those of mask."""
+    sub = mask
+    while True:
+        yield sub
+        if sub == 0:
+            return
+        sub = (sub - 1) & mask
+
+
+class RobotWorker( SearchProblem ):
+
+    def __init__( self, state, goal_item_locations, battery_rules=False ):
+        self.battery_rules = battery_rules
+        self.weight_tenths, self.mask_weight, self.battery_mask = state.robot.items.mask_tables()
+        self.rooms = list(state.room_contents.keys())
+        self.room_index = {room: n for n, room in enumerate(self.rooms)}
+
+        # Static door topology: for each room a list of
+        # (neighbour index, door index, key id) and, for each pair of
+        # rooms, the mask of doors between them (all get unlocked by a move).
+        self.adjacent = [[] for room in self.rooms]
+        self.doors_between = {}
+        self.door_keys = [door.doorkey for door in state.doors]
+        locked = 0
+        for n, door in enumerate(state.doors):
+            roomA, roomB = (self.room_index[r] for r in next(iter(door.other_loc.items())))
+            self.adjacent[roomA].append((roomB, n, door.doorkey))
+            self.adjacent[roomB].append((roomA, n, door.doorkey))
+            self.doors_between[roomA, roomB] = self.doors_between.get((roomA, roomB), 0) | 1 << n
+            self.doors_between[roomB, roomA] = self.doors_between[roomA, roomB]
+            if door.locked:
+                locked |= 1 << n
+
+        self.goal_item_locations = goal_item_locations
+        self.goal_masks = [(self.room_index[room], to_mask(items))
+                           for room, items in goal_item_locations.items()]
+
+        self.initial_state = self.encode(state)
+
+        # Used by the backward search: doors can only ever be locked if they
+        # start locked, and no state can have more strength than the start
+        # plus the bonus of every battery.
+        self.initially_locked = locked
+        self.all_items = self.initial_state[1]
+        for mask in self.initial_state[3]:
+            self.all_items |= mask
+        self.max_strength = self.initial_state[4]
+        if battery_rules:
+            self.max_strength += 100 * (self.all_items & self.battery_mask).bit_count()
+
+    ## The bitmask state equivalent to an object State of the same layout
+    def encode( self, state ):
+        return ( self.room_index[state.robot.location],
+                 to_mask(state.robot.carried_items),
+                 state.locked,
+                 tuple(to_mask(state.room_contents[room]) for room in self.rooms),
+                 round(state.robot.strength * 10) )
+
+    def possible_actions( self, state ):
+        location, carried, locked, rooms, strength = state
+        weight_carried = self.mask_weight[carried]
+        weight_tenths = self.weight_tenths
+        battery_mask = self.battery_mask
+
+        actions = []
+        if self.battery_rules:
+            # Every action costs 1 tenth of strength, and picking up or
+            # putting down a battery changes strength by 100 tenths.
+            for i in mask_items(carried):
+                bonus = 100 if (1 << i) & battery_mask else 0
+                if strength - bonus - 1 >= weight_carried - weight_tenths[i]:
+                    actions.append( ("put down", i) )
+            for i in mask_items(rooms[location]):
+                bonus = 100 if (1 << i) & battery_mask else 0
+                if strength + bonus - 1 >= weight_carried + weight_tenths[i]:
+                    actions.append( ("pick up", i) )
+            if strength - 1 < weight_carried:
+                return actions
+        else:
+            for i in mask_items(carried):
+                if strength >= weight_carried - weight_tenths[i]:
+                    actions.append( ("put down", i) )
+            for i in mask_items(rooms[location]):
+                if strength >= weight_carried + weight_tenths[i]:
+                    actions.append( ("pick up", i) )
+
+        for neighbour, n, doorkey in self.adjacent[location]:
+            if not locked >> n & 1 or (doorkey != None and carried >> doorkey & 1):
+                actions.append( ("move to", self.rooms[neighbour]) )
+        return actions
+
+    def successor( self, state, action ):
+        location, carried, locked, rooms, strength = state
+        act, target = action
+        if act == "move to":
+            target = self.room_index[target]
+            locked &= ~self.doors_between[location, target]
+            location = target
+        else:
+            bit = 1 << target
+            room = rooms[location]
+            if act == "put down":
+                carried ^= bit
+                room |= bit
+            else:
+                carried |= bit
+                room ^= bit
+            rooms = rooms[:location] + (room,) + rooms[location+1:]
+            if self.battery_rules and bit & self.battery_mask:
+                strength += 100 if act == "pick up" else -100
+        if self.battery_rules:
+            strength -= 1
+        return (location, carried, locked, rooms, strength)
+
+    def goal_test( self, state ):
+        rooms = state[3]
+        for room, mask in self.goal_masks:
+            if rooms[room] & mask != mask:
+                return False
+        return True
+
+    def state_key( self, state ):
+        return state
+
+    ## Hooks for the bidirectional 'BD/BFS' search mode. A backward state
+    ## has the same form as a forward one, except that its last element is
+    ## the least strength (in tenths) the robot needs in that state to carry
+    ## on to the goal, rather than its actual strength. A forward state meets
+    ## a backward one if all the rest matches and it has at least that
+    ## much strength.
+
+    def goal_states( self ):
+        goal_rooms = [0] * len(self.rooms)
+        for room, mask in self.goal_masks:
+            goal_rooms[room] |= mask
+        goal_items = 0
+        for mask in goal_rooms:
+            goal_items |= mask
+        # Every other item may be in any room or carried (place len(rooms))
+        free = mask_items(self.all_items & ~goal_items)
+        for places in itertools.product(range(len(self.rooms) + 1), repeat=len(free)):
+            rooms = list(goal_rooms)
+            carried = 0
+            for i, place in zip(free, places):
+                if place == len(self.rooms):
+                    carried |= 1 << i
+                else:
+                    rooms[place] |= 1 << i
+            need = self.mask_weight[carried]
+            if need > self.max_strength:
+                continue
+            rooms = tuple(rooms)
+            for locked in submasks(self.initially_locked):
+                for location in range(len(self.rooms)):
+                    yield (location, carried, locked, rooms, need)
+
+    def predecessors( self, state ):
+        location, carried, locked, rooms, need = state
+        # Every action must leave the robot strong enough for what it then
+        # carries (in the standard rules moving is not checked).
+        need_after = max(need, self.mask_weight[carried])
+
+        steps = []
+        for i in mask_items(rooms[location]):
+            bit = 1 << i
+            before = need_after
+            if self.battery_rules:
+                before += 101 if bit & self.battery_mask else 1
+            room = rooms[location] ^ bit
+            steps.append( (("put down", i),
+                           (location, carried | bit, locked,
+                            rooms[:location] + (room,) + rooms[location+1:], before)) )
+        for i in mask_items(carried):
+            bit = 1 << i
+            before = need_after
+            if self.battery_rules:
+                before += -99 if bit & self.battery_mask else 1
+            room = rooms[location] | bit
+            steps.append( (("pick up", i),
+                           (location, carried ^ bit, locked,
+                            rooms[:location] + (room,) + rooms[location+1:], before)) )
+
+        before = need_after + 1 if self.battery_rules else need
+        for neighbour in dict.fromkeys(neighbour for neighbour, n, doorkey in self.adjacent[location]):
+            doors = self.doors_between[neighbour, location]
+            if locked & doors:
+                continue # the move would have unlocked them
+            for relocked in submasks(doors & self.initially_locked):
+                # The move needs one of the doors to be unlocked or its key carried
+                for n in mask_items(doors):
+                    doorkey = self.door_keys[n]
+                    if not relocked >> n & 1 or (doorkey != None and carried >> doorkey & 1):
+                        steps.append( (("move to", self.rooms[location]),
+                                       (neighbour, carried, locked | relocked, rooms, before)) )
+                        break
+
+        return [step for step in steps if step[1][4] <= self.max_strength]
+
+    def meet_key( self, state ):
+        return state[:4]
+
+    def meets( self, forward_state, backward_state ):
+        return forward_state[4] >= backward_state[4]
+
+    ## Number of goal items not yet in their goal room (same value as
+    ## heuristics.misplaced on the equivalent object state).
+    def misplaced( self, state ):
+        rooms = state[3]
+        return sum( (mask & ~rooms[room]).bit_count() for room, mask in self.goal_masks )
+
+    def display_state( self, state ):
+        location, carried, locked, rooms, strength = state
+        print("Robot location:", self.rooms[location])
+        print("Robot carrying:", mask_items(carried))
+        print("Robot strength:", strength / 10)
+        print("Room contents:", {room: set(mask_items(rooms[n])) for n, room in enumerate(self.rooms)})
@@ -1,3 +1,5 @@
+import math
+
 
 def cost(path, state):
     return len(path)
@@ -67,3 +67,118 @@ def make_carry_locked(goal):
     def carry_locked_with_goal(state):
         return carry_locked(state, goal)
     return carry_locked_with_goal
+
+## Shortest number of moves between every pair of rooms, by breadth-first
+## search over the doors. Locks are ignored, so the distances are never
+## more than the real number of moves and heuristics built on them stay
+## admissible.
+def room_distances(doors):
+    neighbours = {}
+    for door in doors:
+        for room, other in door.other_loc.items():
+            neighbours.setdefault(room, set()).add(other)
+    distances = {}
+    for start in neighbours:
+        dist = {start: 0}
+        frontier = [start]
+        while frontier:
+            next_frontier = []
+            for room in frontier:
+                for other in neighbours[room]:
+                    if other not in dist:
+                        dist[other] = dist[room] + 1
+                        next_frontier.append(other)
+            frontier = next_frontier
+        distances[start] = dist
+    return distances
+
+def distance(distances, roomA, roomB):
+    if roomA == roomB:
+        return 0
+    return distances.get(roomA, {}).get(roomB, float("inf"))
+
+## Lower bound on the actions needed to deliver the misplaced goal items:
+## each carried one needs a put down and each one lying in the wrong room a
+## pick up and a put down. The robot also has to make at least as many
+## moves as the longest single trip it must make: from where it is to the
+## goal room of a carried item, or to an item's room and then on to its goal
+## room.
+def delivery(state, goal_rooms, distances):
+    location = state.robot.location
+    carried = state.robot.carried_items
+    actions = 0
+    moves = 0
+    for item, goal_room in goal_rooms:
+        if item in carried:
+            actions += 1
+            moves = max(moves, distance(distances, location, goal_room))
+        elif item not in state.room_contents[goal_room]:
+            actions += 2
+            for room, items in state.room_contents.items():
+                if item in items:
+                    trip = distance(distances, location, room) + distance(distances, room, goal_room)
+                    moves = max(moves, trip)
+                    break
+    return actions + moves
+
+## The distance table is worked out from the doors of the first state the
+## heuristic is given, and again only if it is given a different layout.
+def make_delivery(goal):
+    goal_rooms = [(item, room) for room, items in goal.items() for item in items]
+    table = {"doors": None, "distances": None}
+    def delivery_with_goal(state):
+        if state.doors is not table["doors"]:
+            table["doors"] = state.doors
+            table["distances"] = room_distances(state.doors)
+        return delivery(state, goal_rooms, table["distances"])
+    return delivery_with_goal
+
+## Batch heuristics. These take a list of states and return a list of
+## values, and have a `batch` attribute so that search() gives them all
+## the children of a node at once. They work over numpy arrays of the
+## bitmask state keys of the problem (problem.state_key gives
+## (location, carried mask, locked mask, room masks, strength) for both the
+## object and the bitmask RobotWorker), so they need the problem as well
+## as the goal.
+
+if hasattr(np, "bitwise_count"):
+    popcount = np.bitwise_count
+else:
+    BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    def popcount(masks):
+        return BYTE_BITS[masks[..., None].view(np.uint8)].sum(axis=-1)
+
+def goal_room_masks(goal, problem):
+    masks = np.zeros(len(problem.rooms), dtype=np.uint64)
+    for n, room in enumerate(problem.rooms):
+        for item in goal.get(room, ()):
+            masks[n] |= np.uint64(1 << item)
+    return masks
+
+def batch_misplaced(keys, goal_masks):
+    rooms = np.array([key[3] for key in keys], dtype=np.uint64)
+    return popcount(goal_masks & ~rooms).sum(axis=1)
+
+## Same value as locked_doors: the number of doors that have a key which
+## is not being carried.
+def batch_locked_doors(keys, door_keys):
+    carried = np.array([key[1] for key in keys], dtype=np.uint64)
+    return ((carried[:, None] >> door_keys[None, :]) & np.uint64(1) == 0).sum(axis=1)
+
+def make_batch_misplaced(goal, problem):
+    goal_masks = goal_room_masks(goal, problem)
+    state_key = problem.state_key
+    def batch_misplaced_with_goal(states):
+        return batch_misplaced([state_key(s) for s in states], goal_masks).tolist()
+    batch_misplaced_with_goal.batch = True
+    return batch_misplaced_with_goal
+
+def make_batch_misplaced_locked(goal, problem):
+    goal_masks = goal_room_masks(goal, problem)
+    door_keys = np.array([key for key in problem.door_keys if key != None], dtype=np.uint64)
+    state_key = problem.state_key
+    def batch_misplaced_locked_with_goal(states):
+        keys = [state_key(s) for s in states]
+        return (batch_misplaced(keys, goal_masks) + batch_locked_doors(keys, door_keys)).tolist()
+    batch_misplaced_locked_with_goal.batch = True
+    return batch_misplaced_locked_with_goal
@@ -1,5 +1,5 @@
 import numpy as np
-from classes_battery import ITEM_NAME
+from item_table import ITEM_KEY
 
 def misplaced(state, goal):
     count = 0
@@ -25,11 +25,12 @@ def carry_right_items(state, goal):
     items = set().union(*state.room_contents.values())
     goal_items = set().union(*goal.values())
     carried_items = state.robot.carried_items
+    item_flags = state.robot.items.flags
     
     for item in items:
         if item not in goal_items:
             if item in carried_items:
-                if not ITEM_NAME[item].startswith("Key"):
+                if not item_flags[item] & ITEM_KEY:
                     count += 1
         else:
             if item not in carried_items:
@@ -60,13 +61,13 @@ def make_misplaced_locked(goal):
         return misplaced_locked(state, goal)
     return misplaced_locked_with_goal
 
-def get_max_weight_in_goal(goal):
+# item_table 为物品表（ItemTable），一般取自状态中的机器人 state.robot.items
+def get_max_weight_in_goal(goal, item_table):
     max_weight = 0
-    from classes import ITEM_WEIGHT
     for room, items in goal.items():
         for item in items:
-            if ITEM_WEIGHT[item] > max_weight:
-                max_weight = ITEM_WEIGHT[item]
+            if item_table.weight[item] > max_weight:
+                max_weight = item_table.weight[item]
     return max_weight
 
 def battery_aware_misplaced(state, goal, max_weight_in_goal):
@@ -74,23 +75,16 @@ def battery_aware_misplaced(state, goal, max_weight_in_goal):
     misplaced_count = misplaced(state, goal)
     
     # 检查机器人是否携带电池
-    is_carrying_battery = False
-    for item in state.robot.carried_items:
-        if ITEM_NAME[item] == "Battery":
-            is_carrying_battery = True
-            break
+    is_carrying_battery = state.robot.has_battery
     
     # 检查场景中是否还有电池未被拾取
     battery_available = False
     battery_room = None
     if not is_carrying_battery:  # 如果机器人没有携带电池，检查是否有电池可拾取
         for room, room_items in state.room_contents.items():
-            for item in room_items:
-                if ITEM_NAME[item] == "Battery":
-                    battery_available = True
-                    battery_room = room
-                    break
-            if battery_available:
+            if not state.robot.items.battery_items.isdisjoint(room_items):
+                battery_available = True
+                battery_room = room
                 break
     
     # 计算当前强度与目标物品最大重量的比值
@@ -114,12 +108,15 @@ def battery_aware_misplaced(state, goal, max_weight_in_goal):
         return misplaced_count
 
 def make_battery_aware_misplaced(goal):
-    # 预计算目标物品中最重的物品重量，使用已有的辅助函数
-    max_weight_in_goal = get_max_weight_in_goal(goal)
+    # 目标物品中最重的物品重量，每个物品表只在第一次用到时计算一次
+    max_weight_in_goal = {}
     
     # 闭包函数中使用预计算的值
     def battery_aware_misplaced_with_goal(state):
-        return battery_aware_misplaced(state, goal, max_weight_in_goal)
+        item_table = state.robot.items
+        if item_table not in max_weight_in_goal:
+            max_weight_in_goal[item_table] = get_max_weight_in_goal(goal, item_table)
+        return battery_aware_misplaced(state, goal, max_weight_in_goal[item_table])
     
     return battery_aware_misplaced_with_goal
 
@@ -132,23 +129,16 @@ def comprehensive_heuristic(state, goal, max_weight_in_goal):
     
     # 3. 检查电池情况
     # 检查机器人是否携带电池
-    is_carrying_battery = False
-    for item in state.robot.carried_items:
-        if ITEM_NAME[item] == "Battery":
-            is_carrying_battery = True
-            break
+    is_carrying_battery = state.robot.has_battery
     
     # 检查场景中是否还有电池未被拾取
     battery_available = False
     battery_room = None
     if not is_carrying_battery:  # 如果机器人没有携带电池，检查是否有电池可拾取
         for room, room_items in state.room_contents.items():
-            for item in room_items:
-                if ITEM_NAME[item] == "Battery":
-                    battery_available = True
-                    battery_room = room
-                    break
-            if battery_available:
+            if not state.robot.items.battery_items.isdisjoint(room_items):
+                battery_available = True
+                battery_room = room
                 break
     
     # 计算当前强度与目标物品最大重量的比值
@@ -168,10 +158,13 @@ def comprehensive_heuristic(state, goal, max_weight_in_goal):
     return heuristic_value
 
 def make_comprehensive_heuristic(goal):
-    # 预计算目标物品中最重的物品重量
-    max_weight_in_goal = get_max_weight_in_goal(goal)
+    # 目标物品中最重的物品重量，每个物品表只在第一次用到时计算一次
+    max_weight_in_goal = {}
     
     def comprehensive_heuristic_with_goal(state):
-        return comprehensive_heuristic(state, goal, max_weight_in_goal)
+        item_table = state.robot.items
+        if item_table not in max_weight_in_goal:
+            max_weight_in_goal[item_table] = get_max_weight_in_goal(goal, item_table)
+        return comprehensive_heuristic(state, goal, max_weight_in_goal[item_table])
     
     return comprehensive_heuristic_with_goal
@@ -0,0 +1,90 @@
+import json
+import os
+
+## Item tables for the RobotWorker engines.
+##
+## An ItemTable holds the weight, name and category flags of every item
+## id, built from the "items" list of a config. Robots carry the table
+## they were made with (robot.items), and the engines read weights and
+## categories from it, so problems built from different configs can be
+## held side by side. Nothing is read at import time: load_item_table()
+## reads a config file the first time a table is asked for (and again
+## only if the file changes).
+
+## Item categories, resolved from the names once so that no search code
+## has to compare strings.
+ITEM_KEY     = 1
+ITEM_BATTERY = 2
+
+def item_flags(name):
+    flags = 0
+    if name.startswith("Key"):
+        flags |= ITEM_KEY
+    if name == "Battery":
+        flags |= ITEM_BATTERY
+    return flags
+
+
+class ItemTable:
+
+    def __init__( self, items ):
+        self.weight = [i["weight"] for i in items]
+        self.name = [i["name"] for i in items]
+        self.flags = [item_flags(i["name"]) for i in items]
+        self.battery_items = frozenset(i for i, flags in enumerate(self.flags) if flags & ITEM_BATTERY)
+        self.masks = None
+
+    def __len__( self ):
+        return len(self.weight)
+
+    ## Tables for the bitmask engine, built on first use: weights in
+    ## tenths, a carried-mask -> total weight table and the mask of the
+    ## battery items.
+    def mask_tables( self ):
+        if self.masks is None:
+            weight_tenths = [round(w * 10) for w in self.weight]
+            mask_weight = [0] * (1 << len(weight_tenths))
+            for mask in range(1, len(mask_weight)):
+                low = mask & -mask
+                mask_weight[mask] = mask_weight[mask ^ low] + weight_tenths[low.bit_length() - 1]
+            battery_mask = 0
+            for i in self.battery_items:
+                battery_mask |= 1 << i
+            self.masks = (weight_tenths, mask_weight, battery_mask)
+        return self.masks
+
+
+## config.json next to this module (not in the current directory), used
+## when no table is given explicitly.
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+## Directory the on-disk caches (case_cache, solution_cache, pdb_cache)
+## are kept in: the one holding config.json, whatever the current directory.
+CACHE_ROOT = os.path.dirname(CONFIG_PATH)
+
+
+## Write the file at path with write(f), f being a binary file. The data
+## goes to a temporary file first, which then replaces path, so other
+## processes never read a partly written file.
+def atomic_write(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+_tables = {}   # path -> (mtime, ItemTable)
+
+def load_item_table(path=CONFIG_PATH):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _tables.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = (mtime, ItemTable(json.load(f)["items"]))
+        _tables[path] = cached
+    return cached[1]
@@ -1,10 +1,13 @@
-import json
 import os
 import time
-import sys
-from classes_battery import Robot, Door, State, RobotWorker, search, ITEM_NAME
+from concurrent.futures import ProcessPoolExecutor
+import classes_battery
+from classes_battery import RobotWorker, search
 
 from heuristics_battery import make_misplaced, make_carry_right_items, make_misplaced_locked, make_battery_aware_misplaced, make_comprehensive_heuristic
+from heuristics import make_delivery
+from pattern_database import make_pattern_database
+from case_compiler import load_compiled_config
 from costs import cost, log_cost
 
 # 搜索策略配置
@@ -13,16 +16,23 @@ def get_search_strategies(goal):
         {"name": "bfs", "mode": "BF/FIFO", "randomise": False, "heuristic_name": "无", "cost_name": "无"},
         {"name": "dfs", "mode": "DF/LIFO", "randomise": False, "heuristic_name": "无", "cost_name": "无"},
         {"name": "dfsr", "mode": "DF/LIFO", "randomise": True, "heuristic_name": "无", "cost_name": "无"},
+        # 迭代加深DFS：内存只与深度成正比，置换表限制为10万个状态
+        {"name": "iddfs", "mode": "ID/DFS", "randomise": False, "tt_size": 100000, "heuristic_name": "无", "cost_name": "无"},
         {"name": "bestf", "mode": "BF/FIFO", "randomise": False, "heuristic": make_misplaced(goal), "heuristic_name": "misplaced", "cost_name": "无"},
         {"name": "bestf", "mode": "BF/FIFO", "randomise": False, "heuristic": make_carry_right_items(goal), "heuristic_name": "carry_right", "cost_name": "无"},
         {"name": "bestf", "mode": "BF/FIFO", "randomise": False, "heuristic": make_misplaced_locked(goal), "heuristic_name": "mis_locked", "cost_name": "无"},
         {"name": "bestf", "mode": "BF/FIFO", "randomise": False, "heuristic": make_battery_aware_misplaced(goal), "heuristic_name": "battery_aware", "cost_name": "无"},
         {"name": "bestf", "mode": "BF/FIFO", "randomise": False, "heuristic": make_comprehensive_heuristic(goal), "heuristic_name": "comprehensive", "cost_name": "无"},
+        {"name": "bestf", "mode": "BF/FIFO", "randomise": False, "heuristic": make_delivery(goal), "heuristic_name": "delivery", "cost_name": "无"},
         {"name": "A*", "mode": "BF/FIFO", "randomise": False, "heuristic": make_misplaced(goal), "heuristic_name": "misplaced", "cost": cost, "cost_name": "cost"},
         {"name": "A*", "mode": "BF/FIFO", "randomise": False, "heuristic": make_carry_right_items(goal), "heuristic_name": "carry_right", "cost": cost, "cost_name": "cost"},
         {"name": "A*", "mode": "BF/FIFO", "randomise": False, "heuristic": make_misplaced_locked(goal), "heuristic_name": "mis_locked", "cost": cost, "cost_name": "cost"},
         {"name": "A*", "mode": "BF/FIFO", "randomise": False, "heuristic": make_battery_aware_misplaced(goal), "heuristic_name": "battery_aware", "cost": cost, "cost_name": "cost"},
         {"name": "A*", "mode": "BF/FIFO", "randomise": False, "heuristic": make_comprehensive_heuristic(goal), "heuristic_name": "comprehensive", "cost": cost, "cost_name": "cost"},
+        # 基于房间距离表的可采纳启发式
+        {"name": "A*", "mode": "BF/FIFO", "randomise": False, "heuristic": make_delivery(goal), "heuristic_name": "delivery", "cost": cost, "cost_name": "cost"},
+        # 模式数据库启发式（第一次使用时构建并保存到磁盘，之后直接读取）
+        {"name": "A*", "mode": "BF/FIFO", "randomise": False, "heuristic": make_pattern_database(goal), "heuristic_name": "pattern_db", "cost": cost, "cost_name": "cost"},
         # 使用对数成本函数的A*搜索配置
         {"name": "A*_log", "mode": "BF/FIFO", "randomise": False, "heuristic": make_misplaced(goal), "heuristic_name": "misplaced", "cost": log_cost, "cost_name": "log_cost"},
         {"name": "A*_log", "mode": "BF/FIFO", "randomise": False, "heuristic": make_carry_right_items(goal), "heuristic_name": "carry_right", "cost": log_cost, "cost_name": "log_cost"},
@@ -31,32 +41,57 @@ def get_search_strategies(goal):
         {"name": "A*_log", "mode": "BF/FIFO", "randomise": False, "heuristic": make_comprehensive_heuristic(goal), "heuristic_name": "comprehensive", "cost": log_cost, "cost_name": "log_cost"}
     ]
 
-# 重定向标准输出，以捕获搜索过程的输出
-class OutputCapture:
-    def __init__(self):
-        self.text = ""
-        self.original_stdout = sys.stdout
+# 读取编译后的配置（每个进程只读取一次）。编译结果按 config.json 的哈希值缓存在
+# case_cache/ 中，config.json 没有修改时不需要再解析 JSON
+_config_data = None
+
+def load_config():
+    global _config_data
+    if _config_data is None:
+        _config_data = load_compiled_config()
+    return _config_data
+
+# 根据编译后的案例（CompiledCase）创建初始状态和目标；没有定义目标状态时目标为None
+def build_case(case):
+    return case.initial_state(classes_battery, load_config().items), case.goal()
+
+# 在工作进程中运行一个（案例, 策略序号）组合。
+# 启发式函数是闭包，不能在进程之间传递，所以在工作进程里重新创建案例和策略列表。
+def run_strategy(job):
+    case_name, strategy_index = job
+    initial_state, goal_item_locations = build_case(load_config().cases[case_name])
+    strategy = get_search_strategies(goal_item_locations)[strategy_index]
     
-    def write(self, message):
-        self.text += message
-        # 完全禁止向控制台输出搜索过程
-        # self.original_stdout.write(message)
+    # 定义测试问题
+    test_problem = RobotWorker(initial_state, goal_item_locations)
     
-    def flush(self):
-        # 让flush操作也不产生输出
-        pass
-
-def run_tests():
-    # 保存原始的标准输出
-    original_stdout = sys.stdout
+    # 模式数据库等启发式在第一次调用时才构建（或读取）查找表，构建过程不检查时间限制，
+    # 所以先在初始状态上调用一次，让构建在计时的搜索开始之前完成
+    if 'heuristic' in strategy:
+        strategy['heuristic'](initial_state)
     
+    # 执行搜索，并获取详细结果
+    return search(
+        test_problem, 
+        strategy['mode'], 
+        1000000, 
+        loop_check=True,
+        randomise=strategy['randomise'],
+        verbose=0,  # 不输出任何搜索过程信息（包括点号）
+        return_info=True,
+        heuristic=strategy['heuristic'] if 'heuristic' in strategy else None,
+        cost=strategy['cost'] if 'cost' in strategy else None,
+        tt_size=strategy['tt_size'] if 'tt_size' in strategy else 0,
+        max_time=10
+    )
+
+# workers为进程数，默认使用所有CPU核心
+def run_tests(workers=None):
     # 创建结果目录（如果不存在）
     if not os.path.exists('results'):
         os.makedirs('results')
     
-    # 读取配置文件
-    with open('config.json', 'r', encoding='utf-8') as f:
-        config_data = json.load(f)
+    config_data = load_config()
     
     # 为每个测试案例创建结果文件
     result_filename = f'results/search_results_{time.strftime("%Y%m%d_%H%M%S")}.txt'
@@ -64,91 +99,41 @@ def run_tests():
     result_file.write("机器人工人问题搜索测试结果\n")
     result_file.write("="*50 + "\n\n")
     
-    # 使用原始的标准输出显示开始测试的信息
     print(f"开始测试，结果将保存到 {result_filename}")
     
+    # 要运行的案例（按配置文件中的顺序），以及每个案例的策略列表
+    cases = [case_name for case_name in config_data.cases if case_name in test_cases]
+    strategies = {}
+    for case_name in cases:
+        initial_state, goal_item_locations = build_case(config_data.cases[case_name])
+        if goal_item_locations is not None:
+            strategies[case_name] = get_search_strategies(goal_item_locations)
+    
+    # 把所有（案例, 策略序号）组合分给进程池。
+    # executor.map按提交顺序返回结果，所以结果表的顺序是确定的。
+    jobs = [(case_name, strategy_index)
+            for case_name in strategies
+            for strategy_index in range(len(strategies[case_name]))]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = dict(zip(jobs, executor.map(run_strategy, jobs)))
+    
     # 遍历每个测试案例
-    for case_name, case_data in config_data['cases'].items():
-        if case_name not in test_cases:
-            continue
+    for case_name in cases:
         result_file.write(f"案例: {case_name}\n")
         result_file.write("-"*50 + "\n")
         
-        # 创建房间内容字典
-        room_contents = {}
-        for room, items_ids in case_data['room contents'].items():
-            room_contents[room] = set(items_ids)
-        
-        # 创建门列表
-        doors = []
-        if case_data['doors']:
-            # 门的格式为 [roomA, roomB, keyId, locked]
-            doors_data = case_data['doors']
-            for door_data in doors_data:
-                doors.append(Door(door_data[0], door_data[1], door_data[2], door_data[3]))
-        
-        # 创建机器人
-        robot_data = case_data.get('robot', {'carried_items': [], 'strength': 10, 'location': list(room_contents.keys())[0]})
-        robot = Robot(
-            robot_data['location'],
-            robot_data.get('carried_items', []),
-            robot_data.get('strength', 10)
-        )
-        
-        # 创建初始状态
-        initial_state = State(robot, doors, room_contents)
-        
-        # 获取目标状态
-        goal_item_locations = {}
-        if 'goal' in case_data and case_data['goal']:
-            # 使用配置中的目标状态
-            for room, items in case_data['goal'].items():
-                if items:  # 只添加有物品的房间作为目标
-                    goal_item_locations[room] = set(items)
-        else:
+        if case_name not in strategies:
             # 如果没有定义目标状态，跳过此案例
             result_file.write("\n没有定义目标状态，跳过此案例\n\n")
             continue
         
-        goal = goal_item_locations.copy()
         # 写入结果表头
         result_file.write("搜索结果:\n")
         result_file.write("策略     |   启发式函数   |   成本函数    |       结果        |   耗时   | 已生成节点  | 已测试节点  | 已抛弃节点  | 剩余节点  | 解路径长度 \n")
         result_file.write("-"*140 + "\n")
         
-        # 获取搜索策略列表
-        SEARCH_STRATEGIES = get_search_strategies(goal)
-        
-        # 针对每种搜索策略进行测试
-        for strategy_index, strategy in enumerate(SEARCH_STRATEGIES):
-            # 我们不再在每个策略开始时显示测试进度
-            # 而是在测试完成后统一显示
-            
-            # 定义测试问题
-            test_problem = RobotWorker(initial_state, goal_item_locations)
-            
-            # 重定向标准输出以捕获搜索结果
-            output_capture = OutputCapture()
-            sys.stdout = output_capture
-            
-            # 执行搜索，并获取详细结果
-            start_time = time.time()
-            search_result = search(
-                test_problem, 
-                strategy['mode'], 
-                1000000, 
-                loop_check=True,
-                randomise=strategy['randomise'],
-                dots=False,  # 确保关闭点号输出
-                return_info=True,
-                heuristic=strategy['heuristic'] if 'heuristic' in strategy else None,
-                cost=strategy['cost'] if 'cost' in strategy else None,
-                max_time=10
-            )
-            end_time = time.time()
-            
-            # 恢复标准输出 (但暂时不输出任何信息)
-            sys.stdout = original_stdout
+        for strategy_index, strategy in enumerate(strategies[case_name]):
+            search_result = results[case_name, strategy_index]
             
             # 提取搜索结果
             search_stats = search_result['search_stats']
@@ -172,7 +157,6 @@ def run_tests():
             result_file.write(" | ".join(result_line) + "\n")
         
         result_file.write("\n")
-        # 每个案例测试完成后才输出提示（使用原始标准输出）
         print(f"案例 {case_name} 的所有搜索策略测试完成。")
     
     # 关闭结果文件
@@ -181,4 +165,4 @@ def run_tests():
 
 if __name__ == "__main__":
     test_cases = ['hard_1']
-    run_tests() 
\ No newline at end of file
+    run_tests()
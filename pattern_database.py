@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from item_table import CACHE_ROOT, ITEM_KEY, atomic_write
+
+## Pattern database heuristic for RobotWorker.
+##
+## The problem is abstracted to a pattern of items: the goal items plus the
+## keys. An abstract state is the robot location, the place of each pattern
+## item (a room, or carried) and which of the doors that start locked are
+## still locked. Every other item is dropped, and so are the strength and
+## weight limits, so each concrete action is either an abstract action or
+## does nothing. The number of actions to reach an abstract goal is
+## therefore never more than the concrete number, and the table values are
+## admissible (and consistent) for both the standard and the battery rules.
+##
+## The table is filled in once by a backward breadth-first search from all
+## the abstract goal states and kept as a numpy uint16 array indexed by
+## abstract state (UNREACHABLE where the goal cannot be reached). It only
+## depends on the layout, the goal and the pattern, so it is saved in
+## PDB_DIR under a hash of those and later runs load it instead.
+##
+## The table has (rooms + 1) ** len(pattern) * rooms * 2 ** lockable
+## entries. If that is more than max_size, the abstraction is made coarser
+## until it fits: first locked doors are treated as always unlocked (and
+## keys no locked door needs leave the pattern), then goal items are
+## dropped. Both only remove constraints, so the values stay admissible.
+
+PDB_DIR = os.path.join(CACHE_ROOT, "pdb_cache")
+PDB_FORMAT = 2   # part of the file hash; bump when the table layout changes
+UNREACHABLE = 65535
+MAX_PDB_SIZE = 1000000   # table entries (2 bytes each); a full build takes seconds
+
+
+class PatternDatabase:
+
+    def __init__( self, state, goal_item_locations, cache_dir=PDB_DIR, max_size=MAX_PDB_SIZE ):
+        self.rooms = list(state.room_contents.keys())
+        self.room_index = {room: n for n, room in enumerate(self.rooms)}
+        self.doors = state.doors
+
+        all_items = set(state.robot.carried_items).union(*state.room_contents.values())
+        goal_rooms = {item: room for room, items in goal_item_locations.items() for item in items}
+        goal_items = sorted(goal_rooms)
+        # Only doors that start locked can ever be locked
+        self.lockable = [n for n, door in enumerate(self.doors) if door.locked]
+
+        places = len(self.rooms) + 1   # a room, or carried (len(rooms))
+        while True:
+            # Keys matter only for the doors that can still be locked
+            needed_keys = {self.doors[n].doorkey for n in self.lockable}
+            keys = {i for i in all_items if state.robot.items.flags[i] & ITEM_KEY and i in needed_keys}
+            self.pattern = sorted(set(goal_items) | keys)
+            self.place_codes = places ** len(self.pattern)
+            self.lock_codes = 1 << len(self.lockable)
+            self.size = self.place_codes * len(self.rooms) * self.lock_codes
+            if self.size <= max_size:
+                break
+            if self.lockable:
+                self.lockable.pop()
+            elif goal_items:
+                goal_items.pop()
+            else:
+                raise ValueError(f"pattern database for {len(self.rooms)} rooms is larger than {max_size}")
+        self.goal_places = [self.room_index[goal_rooms[i]] if i in goal_items else None
+                            for i in self.pattern]
+
+        signature = json.dumps( { "format": PDB_FORMAT,
+                                  "rooms": self.rooms,
+                                  "doors": [ (sorted(door.goes_between), door.doorkey, door.locked)
+                                             for door in self.doors ],
+                                  "goal": sorted((i, goal_rooms[i]) for i in goal_items),
+                                  "pattern": self.pattern,
+                                  "lockable": self.lockable },
+                                sort_keys=True )
+        self.signature = hashlib.sha256(signature.encode()).hexdigest()[:16]
+
+        path = os.path.join(cache_dir, f"pdb_{self.signature}.npy") if cache_dir else None
+        if path and os.path.exists(path):
+            self.table = np.load(path)
+        else:
+            self.table = self.build()
+            if path:
+                atomic_write(path, lambda f: np.save(f, self.table))
+
+    ## Abstract state <-> table index
+    def encode( self, places, location, lock_bits ):
+        code = 0
+        for place in reversed(places):
+            code = code * (len(self.rooms) + 1) + place
+        return (code * len(self.rooms) + location) * self.lock_codes + lock_bits
+
+    def decode( self, index ):
+        index, lock_bits = divmod(index, self.lock_codes)
+        code, location = divmod(index, len(self.rooms))
+        places = []
+        for item in self.pattern:
+            code, place = divmod(code, len(self.rooms) + 1)
+            places.append(place)
+        return places, location, lock_bits
+
+    def build( self ):
+        n_rooms = len(self.rooms)
+        carried = n_rooms
+        table = np.full(self.size, UNREACHABLE, dtype=np.uint16)
+
+        # For each pair of rooms, the doors between them as
+        # (lock bit or None, index of the key in the pattern or None)
+        key_position = {item: k for k, item in enumerate(self.pattern)}
+        between = {}
+        for n, door in enumerate(self.doors):
+            lock_bit = self.lockable.index(n) if n in self.lockable else None
+            key = key_position.get(door.doorkey)
+            for room, other in door.other_loc.items():
+                between.setdefault((self.room_index[other], self.room_index[room]), []).append((lock_bit, key))
+
+        # Abstract goal states: every goal item in its goal room
+        codes = np.arange(self.place_codes)
+        is_goal = np.ones(self.place_codes, dtype=bool)
+        for k, goal_place in enumerate(self.goal_places):
+            if goal_place is not None:
+                is_goal &= (codes // (n_rooms + 1) ** k) % (n_rooms + 1) == goal_place
+        table.reshape(self.place_codes, -1)[is_goal] = 0
+        frontier = np.flatnonzero(table == 0).tolist()
+
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier = []
+            for index in frontier:
+                places, location, lock_bits = self.decode(index)
+                previous = []
+                # Put down (the item was carried) or pick up (it was in the room)
+                for k, place in enumerate(places):
+                    if place == location or place == carried:
+                        before = list(places)
+                        before[k] = carried if place == location else location
+                        previous.append(self.encode(before, location, lock_bits))
+                # Move from a neighbouring room. The move unlocked every door
+                # between the rooms, and needed one of them to be unlocked or
+                # its key to be carried.
+                for (other, room), doors in between.items():
+                    if room != location:
+                        continue
+                    mask = 0
+                    for lock_bit, key in doors:
+                        if lock_bit is not None:
+                            mask |= 1 << lock_bit
+                    if lock_bits & mask:
+                        continue
+                    sub = mask
+                    while True:
+                        for lock_bit, key in doors:
+                            if ( lock_bit is None or not sub >> lock_bit & 1
+                                 or (key is not None and places[key] == carried) ):
+                                previous.append(self.encode(places, other, lock_bits | sub))
+                                break
+                        if sub == 0:
+                            break
+                        sub = (sub - 1) & mask
+                for before in previous:
+                    if table[before] == UNREACHABLE:
+                        # Clamped (never over) so UNREACHABLE always means unreachable
+                        table[before] = min(distance, UNREACHABLE - 1)
+                        next_frontier.append(before)
+            frontier = next_frontier
+        return table
+
+    ## Table value for a RobotWorker State
+    def lookup( self, state ):
+        places = []
+        carried_items = state.robot.carried_items
+        for item in self.pattern:
+            if item in carried_items:
+                places.append(len(self.rooms))
+            else:
+                for n, room in enumerate(self.rooms):
+                    if item in state.room_contents[room]:
+                        places.append(n)
+                        break
+        lock_bits = 0
+        for bit, n in enumerate(self.lockable):
+            if state.locked >> n & 1:
+                lock_bits |= 1 << bit
+        value = self.table[self.encode(places, self.room_index[state.robot.location], lock_bits)]
+        return float("inf") if value == UNREACHABLE else int(value)
+
+
+## Heuristic factory in the style of the heuristics modules. The database
+## is built (or loaded) from the first state the heuristic is given, and
+## again only if it is given a different layout. The build is not checked
+## against a search's max_time, so runners call the heuristic once on the
+## initial state before starting the search.
+def make_pattern_database(goal, cache_dir=PDB_DIR):
+    table = {"doors": None, "pdb": None}
+    def pattern_database_with_goal(state):
+        if state.doors is not table["doors"]:
+            table["doors"] = state.doors
+            table["pdb"] = PatternDatabase(state, goal, cache_dir)
+        return table["pdb"].lookup(state)
+    return pattern_database_with_goal
@@ -1,52 +1,73 @@
 #!/usr/bin/env python3
 import sys
 import json
-from classes import Robot, Door, State, RobotWorker
-import json
+import classes
+import classes_battery
+from bbSearch import search
+from case_compiler import load_compiled_config
+from solution_cache import SolutionCache, canonical_key
+
+# 规则版本 -> 定义 Robot, Door, State, RobotWorker 的模块（请求中的 "rules" 字段，默认为 standard）
+RULES = {"standard": classes, "battery": classes_battery}
+
+# 搜索策略（结果缓存的键中也包含它，修改后旧的结果不会再被使用）
+STRATEGY = {"mode": "BF/FIFO", "max_nodes": 100000, "loop_check": True}
+
+# 搜索结果缓存：内存中的 LRU 加上 solution_cache/ 目录中的文件
+_solutions = SolutionCache()
 
-def run_test(test_data):
+# 编译后的配置（CompiledConfig）：配置文件只在修改后才重新读取，编译结果
+# 按 config.json 的哈希值缓存在 case_cache/ 中（长期运行的 rw_worker.py 也使用这里的缓存）
+def load_config():
+    return load_compiled_config()
+
+# max_time 为搜索的时间限制（秒），请求中的 "timeout" 字段可以设置得更短
+def run_test(test_data, max_time=300):
     try:
         # 加载配置文件
-        with open("config.json", "r") as f:
-            config_data = json.load(f)
+        config = load_config()
         
         # 获取测试参数
         case_key = test_data["case"]
         robot_location = test_data["robot_location"]
         robot_strength = test_data["robot_strength"]
         goals = test_data["goals"]
+        rules = test_data.get("rules", "standard")
         
-        # 确保场景存在
-        if case_key not in config_data["cases"]:
+        # 确保场景和规则版本存在
+        if case_key not in config.cases:
             return {"success": False, "message": "指定的场景不存在"}
+        if rules not in RULES:
+            return {"success": False, "message": "指定的规则版本不存在"}
+        module = RULES[rules]
         
-        case_data = config_data["cases"][case_key]
-        room_contents = case_data["room contents"]
+        case = config.cases[case_key]
+        # 场景本身有错误时只有这个场景的请求失败，其他场景不受影响
+        if case.error is not None:
+            return {"success": False, "message": f"场景配置有误: {case.error}"}
         
         # 确保机器人位置有效
-        if robot_location not in room_contents:
+        if robot_location not in case.room_index:
             return {"success": False, "message": "机器人初始位置无效"}
         
-        # 准备房间内容（转换为集合）
-        room_contents_sets = {}
-        for room, items in room_contents.items():
-            room_contents_sets[room] = set(items)
-        
-        # 准备门信息
-        doors_data = case_data["doors"]
-        doors = []
-        if doors_data:
-            room_a = doors_data[0]
-            room_b = doors_data[1]
-            doorkey = doors_data[2]
-            locked = doors_data[3]
-            doors.append(Door(room_a, room_b, doorkey, locked))
-        
-        # 创建机器人
-        robot = Robot(robot_location, [], robot_strength)
+        # 查找缓存的结果。键中包含场景内容和物品表的哈希值（而不是场景名），
+        # 所以 config.json 中的场景被修改后，旧的结果自然不会再命中
+        cache_key = canonical_key(
+            case=case.signature,
+            items=config.items_signature,
+            robot_location=robot_location,
+            robot_strength=robot_strength,
+            goals={room: sorted(set(items)) for room, items in goals.items() if items},
+            strategy=STRATEGY,
+            rules=rules,
+        )
+        cached = _solutions.get(cache_key)
+        if cached is not None:
+            return dict(cached, cached=True)
         
-        # 创建初始状态
-        initial_state = State(robot, doors, room_contents_sets)
+        # 创建初始状态（房间内容和门来自编译后的场景，机器人使用请求中的位置和力量，
+        # 并且和以前一样开始时不携带任何物品）
+        initial_state = case.initial_state(module, config.items, robot_location, robot_strength, carried=())
         
         # 准备目标物品位置
         goal_item_locations = {}
@@ -57,19 +78,22 @@ def run_test(test_data):
                 goal_item_locations[room].add(item)
         
         # 创建问题实例
-        problem = RobotWorker(initial_state, goal_item_locations)
+        problem = module.RobotWorker(initial_state, goal_item_locations)
         
-        # 运行搜索（导入搜索模块）
-        from bbSearch import search
-        result = search(problem, 'BF/FIFO', 100000, loop_check=True)
+        # 运行搜索（不输出任何搜索过程信息）
+        if "timeout" in test_data:
+            max_time = min(max_time, test_data["timeout"])
+        info = search(problem, STRATEGY["mode"], STRATEGY["max_nodes"], loop_check=STRATEGY["loop_check"],
+                      verbose=0, return_info=True, max_time=max_time)
+        result = info["result"]["termination_condition"]
         
         # 处理结果
         if result == "GOAL_STATE_FOUND":
             # 搜索成功，提取路径和最终状态
-            path = problem.path
-            final_state = problem.final_state
+            path = info["result"]["path"]
+            final_state = info["result"]["goal_state"]
             
-            return {
+            response = {
                 "success": True,
                 "status": "成功找到解决方案",
                 "path_length": len(path),
@@ -78,11 +102,15 @@ def run_test(test_data):
             }
         else:
             # 搜索失败
-            return {
+            response = {
                 "success": False,
                 "message": "无法找到解决方案",
                 "result": result
             }
+        # 超时的结果取决于时间限制和机器负载，不缓存
+        if result != "TIME_LIMIT_EXCEEDED":
+            _solutions.put(cache_key, response)
+        return response
     except Exception as e:
         return {
             "success": False,
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+长期运行的搜索服务：从标准输入逐行读取 JSON 请求，向标准输出逐行写出 JSON 结果。
+
+请求格式与 run_rw_test.py 相同（case, robot_location, robot_strength, goals，可选 rules），
+另外可以带上 "id"（原样放回结果中，用来对应请求和结果）和 "timeout"（秒）。
+工作进程在整个服务期间保持运行，所以配置文件、物品表等只加载一次。
+重复的请求直接使用 run_rw_test.py 的结果缓存（内存中和 solution_cache/ 目录中）。
+
+用法: python rw_worker.py [--workers N] [--max-pending N] [--timeout 秒]
+"""
+import argparse
+import json
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from run_rw_test import run_test
+
+# 写结果时加锁，保证多个线程写出的每一行都是完整的
+_output_lock = threading.Lock()
+
+def write_response(response):
+    line = json.dumps(response, ensure_ascii=False)
+    with _output_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+def serve(workers=None, max_pending=32, timeout=60, input_stream=sys.stdin):
+    executor = ProcessPoolExecutor(max_workers=workers)
+    # 同时在处理（包括排队）的请求数不超过 max_pending，超出的请求直接拒绝
+    pending = threading.BoundedSemaphore(max_pending)
+
+    def finish(request_id, future):
+        try:
+            response = future.result()
+        except Exception as e:
+            response = {"success": False, "message": f"执行测试时出错: {str(e)}"}
+        response["id"] = request_id
+        pending.release()
+        write_response(response)
+
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            test_data = json.loads(line)
+        except ValueError as e:
+            write_response({"success": False, "message": f"请求不是有效的JSON: {str(e)}"})
+            continue
+        # 无效的请求只给这个请求返回错误，服务继续运行
+        if not isinstance(test_data, dict):
+            write_response({"success": False, "message": "请求必须是JSON对象"})
+            continue
+        request_id = test_data.get("id")
+        request_timeout = test_data.get("timeout", timeout)
+        if isinstance(request_timeout, bool) or not isinstance(request_timeout, (int, float)):
+            write_response({"id": request_id, "success": False, "message": "timeout 必须是数字（秒）"})
+            continue
+        if not pending.acquire(blocking=False):
+            write_response({"id": request_id, "success": False, "message": "服务繁忙，请稍后再试"})
+            continue
+        # 每个请求的时间限制：请求中的 timeout 不能超过服务的 timeout
+        max_time = min(request_timeout, timeout)
+        try:
+            future = executor.submit(run_test, test_data, max_time)
+        except Exception as e:
+            pending.release()
+            write_response({"id": request_id, "success": False, "message": f"执行测试时出错: {str(e)}"})
+            continue
+        future.add_done_callback(lambda future, request_id=request_id: finish(request_id, future))
+
+    # 输入结束后等所有请求完成再退出
+    executor.shutdown(wait=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="机器人工人问题搜索服务 (JSON-lines)")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认为CPU核心数）")
+    parser.add_argument("--max-pending", type=int, default=32, help="最多同时处理的请求数")
+    parser.add_argument("--timeout", type=float, default=60, help="每个请求的最长搜索时间（秒）")
+    args = parser.parse_args()
+    serve(args.workers, args.max_pending, args.timeout)
@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from bbSearch import SearchMonitor, search, strategy_options
+
+## Asynchronous search jobs for asyncio programs.
+##
+## Searches run in a process pool, so the event loop stays responsive
+## while they run. SearchJobs.submit returns a job id at once; the job can
+## then be polled (status), its progress streamed (stream), cancelled
+## (cancel) and its return_info fetched (result).
+##
+## A strategy is a dict as for search_portfolio: a "mode" and any other
+## keyword arguments of search, with "heuristic_factory" and
+## "heuristic_args" for heuristics that cannot be sent to another process.
+##
+## The workers report progress through the search progress callback into
+## a dict shared through a multiprocessing Manager. The same callback
+## returns True once the job has been cancelled, which stops the search
+## with "SEARCH_CANCELLED" (within SearchMonitor.PROGRESS_PERIOD seconds).
+## A job cancelled before it has started never runs.
+
+
+def job_worker( problem, strategy, max_nodes, max_time, job_id, progress, cancelled ):
+    options = dict(strategy)
+    mode = options.pop("mode")
+    progress[job_id] = None   # started, no progress yet
+    def report(info):
+        progress[job_id] = info
+        return job_id in cancelled
+    return search( problem, mode, max_nodes, verbose=0, return_info=True,
+                   max_time=max_time, progress=report, **strategy_options(options) )
+
+
+class SearchJobs:
+
+    def __init__( self, workers=None ):
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.manager = multiprocessing.Manager()
+        self.progress = self.manager.dict()
+        self.cancelled = self.manager.dict()
+        self.futures = {}   # job id -> concurrent.futures.Future
+        self.waiters = {}   # job id -> asyncio.Future
+        self.ids = itertools.count(1)
+
+    ## Start a search and return its job id. Must be called from a
+    ## coroutine (or callback) running in the event loop.
+    def submit( self, problem, strategy, max_nodes=100000, max_time=300 ):
+        job_id = next(self.ids)
+        future = self.executor.submit( job_worker, problem, strategy, max_nodes, max_time,
+                                       job_id, self.progress, self.cancelled )
+        self.futures[job_id] = future
+        self.waiters[job_id] = asyncio.wrap_future(future, loop=asyncio.get_running_loop())
+        return job_id
+
+    ## State of a job ("pending", "running", "done", "cancelled" or
+    ## "failed") and its latest progress information (or None).
+    def status( self, job_id ):
+        future = self.futures[job_id]
+        if future.cancelled():
+            state = "cancelled"
+        elif future.done():
+            if future.exception() is not None:
+                state = "failed"
+            elif future.result()["result"]["termination_condition"] == "SEARCH_CANCELLED":
+                state = "cancelled"
+            else:
+                state = "done"
+        elif job_id in self.progress:
+            state = "running"
+        else:
+            state = "pending"
+        return {"job_id": job_id, "state": state, "progress": self.progress.get(job_id)}
+
+    ## Yield the progress information of a job each time it changes,
+    ## until the job has finished.
+    async def stream( self, job_id, period=SearchMonitor.PROGRESS_PERIOD ):
+        waiter = self.waiters[job_id]
+        last = None
+        while True:
+            finished = waiter.done()
+            info = self.progress.get(job_id)
+            if info is not None and info != last:
+                last = info
+                yield info
+            if finished:
+                return
+            await asyncio.wait([waiter], timeout=period)
+
+    ## Ask a job to stop. Returns False if it had already finished.
+    def cancel( self, job_id ):
+        future = self.futures[job_id]
+        if future.done():
+            return False
+        self.cancelled[job_id] = True
+        future.cancel()   # only succeeds if the job has not started
+        return True
+
+    ## The return_info of a finished job. Raises asyncio.CancelledError if
+    ## the job was cancelled before it started, or the exception the
+    ## search raised.
+    async def result( self, job_id ):
+        return await asyncio.shield(self.waiters[job_id])
+
+    ## Drop everything kept about a finished job.
+    def forget( self, job_id ):
+        del self.futures[job_id]
+        del self.waiters[job_id]
+        self.progress.pop(job_id, None)
+        self.cancelled.pop(job_id, None)
+
+    def close( self ):
+        for job_id in list(self.futures):
+            self.cancel(job_id)
+        self.executor.shutdown(wait=True)
+        self.manager.shutdown()
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from item_table import CACHE_ROOT, atomic_write
+
+## Cache of search results for run_rw_test.run_test.
+##
+## Results are keyed by a hash of everything that decides them: the case
+## data and item table from config.json, the robot start and strength, the
+## goals, the search strategy and the rules variant. Editing a case (or an
+## item) in config.json therefore gives new keys, so stale results are
+## never used. Lookups try a bounded in-memory LRU first and then a JSON
+## file per key in cache_dir; results found on disk are moved into memory.
+
+SOLUTION_CACHE_DIR = os.path.join(CACHE_ROOT, "solution_cache")
+
+
+def canonical_key(**parts):
+    """Hash of the parts as canonical JSON (sorted keys, no spaces)."""
+    text = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SolutionCache:
+
+    def __init__( self, maxsize=256, cache_dir=SOLUTION_CACHE_DIR ):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.memory = OrderedDict()
+
+    def path( self, key ):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get( self, key ):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        if self.cache_dir:
+            try:
+                with open(self.path(key), "r", encoding="utf-8") as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self.remember(key, result)
+            return result
+        return None
+
+    def put( self, key, result ):
+        self.remember(key, result)
+        if self.cache_dir:
+            data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+            atomic_write(self.path(key), lambda f: f.write(data))
+
+    def remember( self, key, result ):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)